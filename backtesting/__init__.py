@@ -0,0 +1,9 @@
+'''
+Rolling-origin backtesting of the forecasting models over the county x month panel.
+
+Usage: python -m backtesting DATA_DIR [--models naive,drift,arima_110] [--horizon 8] [--folds 3] [--out backtest]
+'''
+from .metrics import smape, smape_terms, smape_by_group, summarize
+from .folds import build_panel, fill_missing, Panel, Fold, get_cutoffs
+from .forecasters import FORECASTERS
+from .runner import run_backtest
@@ -0,0 +1,35 @@
+'''
+Import libraries
+'''
+import argparse
+import os
+import pandas as pd
+from .forecasters import FORECASTERS
+from .runner import run_backtest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m backtesting', description='Backtest forecasters over expanding-window folds')
+    parser.add_argument('data_dir')
+    parser.add_argument('--models', default='naive,drift,seasonal_naive,arima_110,ses',
+                        help='comma separated, from: {}'.format(', '.join(FORECASTERS)))
+    parser.add_argument('--horizon', type=int, default=8)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--step', type=int, default=1, help='months between fold cutoffs')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='backtest', help='directory for the leaderboard and detail tables')
+    args = parser.parse_args()
+
+    names = args.models.split(',')
+    unknown = [name for name in names if name not in FORECASTERS]
+    if unknown:
+        parser.error('unknown models: {}'.format(', '.join(unknown)))
+
+    train_df = pd.read_csv(os.path.join(args.data_dir, 'train.csv'))
+    census_path = os.path.join(args.data_dir, 'census_starter.csv')
+    census_df = pd.read_csv(census_path, index_col='cfips') if os.path.exists(census_path) else None
+
+    tables = run_backtest(train_df, census_df, names, args.horizon, args.folds, args.step, args.workers)
+    os.makedirs(args.out, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(args.out, name + '.csv'), index=False)
+    print(tables['leaderboard'].to_string(index=False, float_format='{:.4f}'.format))
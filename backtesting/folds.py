@@ -0,0 +1,107 @@
+'''
+Import libraries
+'''
+import numpy as np
+import pandas as pd
+
+'''
+Function: Build the counties x months array of a long train frame
+Parameters: train dataframe, date column, target column
+Returns: array of cfips, DatetimeIndex of months, 2-D float array of values (NaN where a county has no row for a month)
+'''
+def build_panel(df, date_column='first_day_of_month', target_column='microbusiness_density'):
+    cfips, county_index = np.unique(df['cfips'].to_numpy(), return_inverse=True)
+    months, month_index = np.unique(pd.to_datetime(df[date_column]).to_numpy(), return_inverse=True)
+    values = np.full((len(cfips), len(months)), np.nan)
+    values[county_index, month_index] = df[target_column].to_numpy(dtype='float64')
+    return cfips, pd.DatetimeIndex(months), values
+
+'''
+Function: Fill the odd missing month of a history from its neighbours so every row is a complete series
+Parameters: counties x months array
+Returns: array without NaN (unless a county has no value at all)
+'''
+def fill_missing(values):
+    if np.isnan(values).any():
+        values = pd.DataFrame(values).ffill(axis=1).bfill(axis=1).to_numpy()
+    return values
+
+'''
+Class: County x month panel of the train data, the common input of every forecaster
+Attributes: cfips, state per county, month dates, counties x months density array (NaN where missing), long train frame, census frame
+'''
+class Panel:
+    def __init__(self, train_df, census_df=None):
+        self.cfips, self.months, self.values = build_panel(train_df)
+        self.states = train_df.drop_duplicates('cfips').set_index('cfips')['state'].reindex(self.cfips).astype(object).to_numpy()
+        self.train_df = train_df
+        self.census_df = census_df
+
+'''
+Class: One expanding-window fold: everything before the cutoff month is history
+Attributes: panel, cutoff month index, horizon
+'''
+class Fold:
+    def __init__(self, panel, cutoff, horizon):
+        self.panel = panel
+        self.cutoff = cutoff
+        self.horizon = horizon
+
+    '''
+    Function: Get the history as a counties x months array, missing months filled from the history alone
+    Parameters: None
+    Returns: array
+    '''
+    def get_values(self):
+        return fill_missing(self.panel.values[:, :self.cutoff])
+
+    '''
+    Function: Get the history as the long train frame
+    Parameters: None
+    Returns: dataframe
+    '''
+    def get_train_df(self):
+        dates = pd.to_datetime(self.panel.train_df['first_day_of_month'])
+        return self.panel.train_df[dates < self.panel.months[self.cutoff]]
+
+    '''
+    Function: Get the months to forecast as a long frame shaped like test.csv
+    Parameters: None
+    Returns: dataframe (row_id, cfips, first_day_of_month)
+    '''
+    def get_test_df(self):
+        dates = self.panel.months[self.cutoff:self.cutoff + self.horizon].strftime('%Y-%m-%d')
+        cfips = np.repeat(self.panel.cfips, len(dates))
+        months = np.tile(np.asarray(dates), len(self.panel.cfips))
+        return pd.DataFrame({'row_id': pd.Series(cfips).astype(str) + '_' + months, 'cfips': cfips, 'first_day_of_month': months})
+
+    '''
+    Function: Get the actual values of the forecast months
+    Parameters: None
+    Returns: counties x horizon array, NaN where a month is missing (left out of the scores)
+    '''
+    def get_actual(self):
+        return self.panel.values[:, self.cutoff:self.cutoff + self.horizon]
+
+'''
+Function: Get the cutoffs of expanding-window folds, the last one ending at the last month
+Parameters: number of months, horizon, number of folds, months between cutoffs
+Returns: list of cutoff month indices, oldest first
+'''
+def get_cutoffs(num_months, horizon, num_folds, step=1):
+    cutoffs = [num_months - horizon - k * step for k in reversed(range(num_folds))]
+    if cutoffs[0] < 2:
+        raise ValueError('{} folds of horizon {} need more than {} months'.format(num_folds, horizon, num_months))
+    return cutoffs
+
+'''
+Function: Convert a long forecast frame to a counties x horizon array in panel order
+Parameters: Fold, dataframe with row_id (or cfips and first_day_of_month) and microbusiness_density
+Returns: array
+'''
+def frame_to_array(fold, forecast_df):
+    expected = fold.get_test_df()
+    if 'row_id' not in forecast_df.columns:
+        forecast_df = forecast_df.assign(row_id=forecast_df['cfips'].astype(str) + '_' + pd.to_datetime(forecast_df['first_day_of_month']).dt.strftime('%Y-%m-%d'))
+    values = expected[['row_id']].merge(forecast_df[['row_id', 'microbusiness_density']], on='row_id', how='left')['microbusiness_density']
+    return values.to_numpy(dtype='float64').reshape(len(fold.panel.cfips), fold.horizon)
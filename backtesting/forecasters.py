@@ -0,0 +1,71 @@
+'''
+Forecasters that can be backtested. Each one takes a Fold and returns a counties x horizon
+array in panel order; models are imported from the solution folders when first used.
+'''
+
+'''
+Import libraries
+'''
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for solution_dir in ('med_risk_solution', 'high_risk_solution'):
+    path = os.path.join(ROOT_DIR, solution_dir)
+    if path not in sys.path:
+        sys.path.append(path)
+
+'''
+Function: Get a baseline forecaster of batch_forecast.py
+Parameters: method name
+Returns: forecaster function
+'''
+def get_batch_forecaster(method):
+    def forecast(fold):
+        import batch_forecast
+        return batch_forecast.METHODS[method](fold.get_values(), fold.horizon)
+    return forecast
+
+'''
+Function: Forecast with one Prophet model per county
+Parameters: Fold
+Returns: counties x horizon array
+'''
+def forecast_prophet(fold):
+    import prophet_forecast
+    from .folds import frame_to_array
+
+    # Folds already run in parallel, so each fold fits its counties in one process
+    with tempfile.TemporaryDirectory() as out_dir:
+        forecast_df = prophet_forecast.forecast_counties(fold.get_train_df(), out_dir, fold.horizon, workers=1)
+    return frame_to_array(fold, forecast_df)
+
+'''
+Function: Forecast with the LightGBM model, recursively over the horizon
+Parameters: Fold
+Returns: counties x horizon array
+'''
+def forecast_lgbm(fold):
+    import recursive_forecast
+    from feature_store import FeatureStore
+    from .folds import frame_to_array
+
+    train_df = fold.get_train_df()
+    store = FeatureStore.from_frames(train_df, fold.get_test_df(), fold.panel.census_df)
+    model = recursive_forecast.train_model(store, {}, fold.cutoff)
+    predictions = recursive_forecast.forecast_recursive(model, store, fold.cutoff, fold.horizon)
+    return frame_to_array(fold, predictions.rename_axis('row_id').reset_index())
+
+'''
+Forecasters by name
+'''
+FORECASTERS = {
+    'naive': get_batch_forecaster('naive'),
+    'drift': get_batch_forecaster('drift'),
+    'seasonal_naive': get_batch_forecaster('seasonal_naive'),
+    'arima_110': get_batch_forecaster('arima_110'),
+    'ses': get_batch_forecaster('ses'),
+    'prophet': forecast_prophet,
+    'lgbm': forecast_lgbm,
+}
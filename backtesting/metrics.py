@@ -0,0 +1,52 @@
+'''
+Import libraries
+'''
+import numpy as np
+import pandas as pd
+
+'''
+Function: Element-wise SMAPE terms of a forecast, as scored by the competition
+Parameters: actual array, forecast array of the same shape (e.g. counties x horizon)
+Returns: masked array of 100 * |F - A| / ((|A| + |F|) / 2), 0 where both are 0, masked where the actual value is missing
+'''
+def smape_terms(actual, forecast):
+    actual = np.asarray(actual, dtype='float64')
+    forecast = np.asarray(forecast, dtype='float64')
+    denominator = (np.abs(actual) + np.abs(forecast)) / 2
+    terms = 100 * np.divide(np.abs(forecast - actual), denominator, out=np.zeros(np.broadcast(actual, forecast).shape), where=denominator != 0)
+
+    # A missing actual is not scored; a missing forecast is, and makes the score NaN
+    return np.ma.masked_array(terms, mask=np.broadcast_to(np.isnan(actual), terms.shape))
+
+'''
+Function: SMAPE over all values, or along one axis
+Parameters: actual array, forecast array, axis (None for all values)
+Returns: SMAPE (NaN where no actual value is known)
+'''
+def smape(actual, forecast, axis=None):
+    mean = np.ma.filled(smape_terms(actual, forecast).mean(axis=axis), np.nan)
+    return float(mean) if axis is None else mean
+
+'''
+Function: Mean SMAPE of the counties of each group, e.g. each state
+Parameters: counties x horizon SMAPE terms from smape_terms, integer group code per county, number of groups
+Returns: array of SMAPE per group (NaN for groups without actual values)
+'''
+def smape_by_group(terms, codes, num_groups):
+    totals = np.bincount(codes, weights=np.ma.filled(terms.sum(axis=1), 0), minlength=num_groups)
+    counts = np.bincount(codes, weights=terms.count(axis=1), minlength=num_groups)
+    return np.divide(totals, counts, out=np.full(num_groups, np.nan), where=counts > 0)
+
+'''
+Function: Summarize the SMAPE terms of one forecast per county, per state and per horizon step
+Parameters: counties x horizon SMAPE terms from smape_terms, cfips array, state per county
+Returns: dictionary of overall SMAPE and county, state and horizon dataframes
+'''
+def summarize(terms, cfips, states):
+    codes, names = pd.factorize(pd.Series(states).astype(object).to_numpy())
+    return {
+        'overall': float(np.ma.filled(terms.mean(), np.nan)),
+        'county': pd.DataFrame({'cfips': cfips, 'state': states, 'smape': np.ma.filled(terms.mean(axis=1), np.nan)}),
+        'state': pd.DataFrame({'state': names, 'smape': smape_by_group(terms, codes, len(names))}),
+        'horizon': pd.DataFrame({'horizon': np.arange(1, terms.shape[1] + 1), 'smape': np.ma.filled(terms.mean(axis=0), np.nan)}),
+    }
@@ -0,0 +1,71 @@
+'''
+Import libraries
+'''
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from .folds import Panel, Fold, get_cutoffs
+from .forecasters import FORECASTERS
+from .metrics import smape_terms, summarize
+
+# Panel of the current worker process, set once by the pool initializer
+_panel = {}
+
+'''
+Function: Keep the panel in a worker process
+Parameters: Panel
+Returns: None
+'''
+def init_worker(panel):
+    _panel['panel'] = panel
+
+'''
+Function: Run one forecaster on one fold
+Parameters: forecaster name, cutoff month index, horizon
+Returns: forecaster name, cutoff, counties x horizon forecast, seconds taken
+'''
+def run_task(name, cutoff, horizon):
+    start = time.time()
+    forecast = FORECASTERS[name](Fold(_panel['panel'], cutoff, horizon))
+    return name, cutoff, forecast, time.time() - start
+
+'''
+Function: Backtest forecasters over expanding-window folds of the panel, folds in parallel
+Parameters: train dataframe, census dataframe indexed by cfips, forecaster names, horizon, number of folds,
+months between fold cutoffs, worker processes
+Returns: dictionary of leaderboard, county, state and horizon dataframes
+'''
+def run_backtest(train_df, census_df=None, names=None, horizon=8, num_folds=3, step=1, workers=None):
+    panel = Panel(train_df, census_df)
+    names = list(names or FORECASTERS)
+    cutoffs = get_cutoffs(len(panel.months), horizon, num_folds, step)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(panel,)) as pool:
+        futures = [pool.submit(run_task, name, cutoff, horizon) for name in names for cutoff in cutoffs]
+        for future in futures:
+            name, cutoff, forecast, seconds = future.result()
+            terms = smape_terms(Fold(panel, cutoff, horizon).get_actual(), forecast)
+            results.append((name, cutoff, seconds, summarize(terms, panel.cfips, panel.states)))
+            print('{} fold {}: SMAPE {:.4f} ({:.1f}s)'.format(name, panel.months[cutoff].strftime('%Y-%m'), results[-1][3]['overall'], seconds))
+    return build_tables(panel, results)
+
+'''
+Function: Combine the per-fold summaries into comparable tables
+Parameters: Panel, list of (forecaster name, cutoff, seconds, summary)
+Returns: dictionary of leaderboard, county, state and horizon dataframes
+'''
+def build_tables(panel, results):
+    tables = {}
+    for level in ('county', 'state', 'horizon'):
+        frames = [summary[level].assign(model=name, fold=panel.months[cutoff].strftime('%Y-%m-%d')) for name, cutoff, _, summary in results]
+        tables[level] = pd.concat(frames, ignore_index=True)
+
+    folds = pd.DataFrame([(name, summary['overall'], seconds) for name, _, seconds, summary in results], columns=['model', 'smape', 'seconds'])
+    leaderboard = folds.groupby('model').agg(smape=('smape', 'mean'), smape_std=('smape', 'std'), folds=('smape', 'size'), seconds=('seconds', 'sum'))
+
+    # One column per horizon step, averaged over folds
+    by_horizon = tables['horizon'].pivot_table(index='model', columns='horizon', values='smape', aggfunc='mean')
+    by_horizon.columns = ['h{}'.format(step) for step in by_horizon.columns]
+    tables['leaderboard'] = leaderboard.join(by_horizon).sort_values('smape').reset_index()
+    return tables
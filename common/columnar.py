@@ -0,0 +1,102 @@
+'''
+Convert the competition csv files into typed, memory-mappable columnar files and read them back.
+
+Usage: python columnar.py [DATA_DIR]
+
+Writes <name>.feather (uncompressed Arrow IPC) next to train.csv, test.csv and census_starter.csv:
+  - cfips as int32 plus fips, the zero-padded five character string
+  - first_day_of_month as a date
+  - state and county as dictionary encoded (categorical) columns
+'''
+
+'''
+Import libraries
+'''
+import os
+import sys
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+DATASETS = ['train', 'test', 'census_starter']
+
+'''
+Function: Get the csv and columnar paths of a dataset
+Parameters: data directory, dataset name
+Returns: csv path, columnar path
+'''
+def get_paths(data_dir, name):
+    return os.path.join(data_dir, name + '.csv'), os.path.join(data_dir, name + '.feather')
+
+'''
+Function: Check whether an up to date columnar copy of a dataset exists
+Parameters: data directory, dataset name
+Returns: True if the columnar file exists and is not older than the csv
+'''
+def has_columnar(data_dir, name):
+    csv_path, columnar_path = get_paths(data_dir, name)
+    if not os.path.exists(columnar_path):
+        return False
+    return not os.path.exists(csv_path) or os.path.getmtime(columnar_path) >= os.path.getmtime(csv_path)
+
+'''
+Function: Read a csv file and apply the column types
+Parameters: csv path
+Returns: typed dataframe
+'''
+def read_typed_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    df['cfips'] = df['cfips'].astype('int32')
+    df['fips'] = df['cfips'].astype(str).str.zfill(5)
+    if 'first_day_of_month' in df.columns:
+        df['first_day_of_month'] = pd.to_datetime(df['first_day_of_month']).dt.date
+    for column in ('state', 'county'):
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+'''
+Function: Convert one dataset to its columnar file
+Parameters: data directory, dataset name
+Returns: columnar path, or None when the csv does not exist
+'''
+def convert_dataset(data_dir, name):
+    csv_path, columnar_path = get_paths(data_dir, name)
+    if not os.path.exists(csv_path):
+        return None
+    table = pa.Table.from_pandas(read_typed_csv(csv_path), preserve_index=False)
+
+    # Uncompressed so readers can memory-map the file instead of decoding it
+    tmp_path = columnar_path + '.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, columnar_path)
+    return columnar_path
+
+'''
+Function: Convert every dataset in a directory
+Parameters: data directory
+Returns: list of written paths
+'''
+def convert_all(data_dir):
+    written = []
+    for name in DATASETS:
+        start = time.time()
+        path = convert_dataset(data_dir, name)
+        if path is not None:
+            print('Wrote {} ({:.1f}s)'.format(path, time.time() - start))
+            written.append(path)
+    return written
+
+'''
+Function: Read a columnar dataset, memory-mapping the file and decoding only the requested columns
+Parameters: data directory, dataset name, list of columns (None for all)
+Returns: dataframe
+'''
+def read_columnar(data_dir, name, columns=None):
+    _, columnar_path = get_paths(data_dir, name)
+    table = feather.read_table(columnar_path, columns=columns, memory_map=True)
+    return table.to_pandas(date_as_object=False)
+
+if __name__ == '__main__':
+    convert_all(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
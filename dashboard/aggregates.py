@@ -0,0 +1,292 @@
+'''
+Import libraries
+'''
+import lazy
+
+np = lazy.lazy_import('numpy')
+pd = lazy.lazy_import('pandas')
+
+SERIES_COLUMNS = ['first_day_of_month', 'active', 'microbusiness_density']
+
+# Refreshes a SeriesIndex keeps as pending updates before merging them into every series
+MAX_PENDING_UPDATES = 4
+
+'''
+Function: Roll up active microbusinesses and mean density by month for the given keys
+Parameters: mbd dataframe, list of grouping columns
+Returns: dataframe with one row per key and month
+'''
+def rollup(df, keys):
+    return df.groupby(keys + ['first_day_of_month'], observed=True).agg(
+        active=('active', 'sum'),
+        microbusiness_density=('microbusiness_density', 'mean')).reset_index()
+
+'''
+Function: Find the block of rows of every key in a rolled up dataframe
+Parameters: rolled up dataframe (sorted by key), list of key columns
+Returns: dictionary of key -> (start, stop) row positions
+'''
+def get_key_ranges(rolled, keys):
+    key_df = rolled[keys].astype(str)
+
+    # Rows are sorted by key, so every key owns one contiguous block of rows
+    changed = (key_df != key_df.shift()).any(axis=1).to_numpy()
+    starts = list(changed.nonzero()[0]) + [len(rolled)]
+    key_values = list(key_df.itertuples(index=False, name=None))
+
+    ranges = {}
+    for start, stop in zip(starts[:-1], starts[1:]):
+        key = key_values[start] if len(keys) > 1 else key_values[start][0]
+        ranges[key] = (start, stop)
+    return ranges
+
+'''
+Function: Split a rolled up dataframe into one monthly series per key
+Parameters: rolled up dataframe (sorted by key), list of key columns
+Returns: dictionary of key -> dataframe (first_day_of_month, active, microbusiness_density)
+'''
+def split_by_key(rolled, keys):
+    series_df = rolled[SERIES_COLUMNS]
+    return {key: series_df.iloc[start:stop].reset_index(drop=True) for key, (start, stop) in get_key_ranges(rolled, keys).items()}
+
+'''
+Class: Monthly series by state or county; refreshes add rolled up months that are merged into a key's series when it is first looked up
+Attributes: series by key with the number of updates merged into each, updates (rolled up rows of new months and their key ranges)
+'''
+class SeriesIndex:
+    def __init__(self, series):
+        self.entries = {key: (frame, 0) for key, frame in series.items()}
+        self.updates = []
+
+    '''
+    Function: Look up the series of a key, merging in the updates it has not seen yet
+    Parameters: key
+    Returns: dataframe (first_day_of_month, active, microbusiness_density), or None if unknown
+    '''
+    def get(self, key, default=None):
+        frame, merged = self.entries.get(key, (None, 0))
+        if merged < len(self.updates):
+            for rolled, ranges in self.updates[merged:]:
+                block = ranges.get(key)
+                if block is not None:
+                    update = rolled.iloc[block[0]:block[1]].reset_index(drop=True)
+                    frame = merge_series(frame, update) if frame is not None else update
+            # Another thread may merge the same key at once; both get the same frame
+            self.entries[key] = (frame, len(self.updates))
+        return frame if frame is not None else default
+
+    '''
+    Function: Add the rolled up rows of new months
+    Parameters: rolled up dataframe of the touched months (sorted by key), list of key columns
+    Returns: new SeriesIndex; this one is left unchanged for the snapshot that holds it
+    '''
+    def update(self, rolled, keys):
+        index = SeriesIndex({})
+        index.entries = dict(self.entries)
+        index.updates = self.updates + [(rolled[SERIES_COLUMNS], get_key_ranges(rolled, keys))]
+        if len(index.updates) > MAX_PENDING_UPDATES:
+            index.compact(keys)
+        return index
+
+    '''
+    Function: Merge the pending updates into every series at once, so lookups and memory stop growing with the refreshes
+    Parameters: list of key columns
+    Returns: None
+    '''
+    def compact(self, keys):
+        frames, labels, merged_counts = [], [], []
+        for key, (frame, merged) in self.entries.items():
+            if frame is not None:
+                frames.append(frame)
+                labels.extend([key] * len(frame))
+                merged_counts.append(np.full(len(frame), merged))
+        for number, (rolled, ranges) in enumerate(self.updates, 1):
+            frames.append(rolled)
+            for key, (start, stop) in ranges.items():
+                labels.extend([key] * (stop - start))
+            merged_counts.append(np.full(len(rolled), number))
+
+        # A month seen by several sources keeps the row of the latest update; a series that already
+        # merged an update holds the same row
+        combined = pd.concat(frames, ignore_index=True)
+        key_df = pd.DataFrame(labels if len(keys) > 1 else {keys[0]: labels}, columns=keys)
+        combined = pd.concat([key_df, combined], axis=1).assign(merged=np.concatenate(merged_counts))
+        combined = combined.sort_values(keys + ['first_day_of_month', 'merged'], kind='stable')
+        combined = combined.drop_duplicates(keys + ['first_day_of_month'], keep='last').reset_index(drop=True)
+        self.entries = {key: (frame, 0) for key, frame in split_by_key(combined, keys).items()}
+        self.updates = []
+
+'''
+Function: Build the national, state and county x month aggregate cube
+Parameters: mbd dataframe
+Returns: dictionary with 'national' series, 'state' and 'county' lookups and landing page counts
+'''
+def build_aggregate_cube(df):
+    national = rollup(df, [])
+    state = rollup(df, ['state'])
+    county = rollup(df, ['state', 'county'])
+    return {
+        'national': national,
+        'state': SeriesIndex(split_by_key(state, ['state'])),
+        'county': SeriesIndex(split_by_key(county, ['state', 'county'])),
+        'num_states': df.state.unique().size - 1,
+        'num_counties': df.county.unique().size,
+    }
+
+'''
+Function: Merge monthly series rolled up from new rows into an existing series, replacing the months they cover
+Parameters: existing series dataframe, series dataframe of the new rows
+Returns: new dataframe sorted by month
+'''
+def merge_series(series, update):
+    months = update['first_day_of_month']
+    if len(series) and months.min() > series['first_day_of_month'].iloc[-1]:
+        # The usual case: the new rows are later months
+        return pd.concat([series, update], ignore_index=True)
+    kept = series[~series['first_day_of_month'].isin(months)]
+    return pd.concat([kept, update]).sort_values('first_day_of_month').reset_index(drop=True)
+
+'''
+Function: Update the aggregate cube for new rows, re-rolling only the months they touch
+Parameters: aggregate cube, mbd dataframe including the new rows, new rows
+Returns: new aggregate cube; state and county series are merged when first looked up
+'''
+def update_aggregate_cube(cube, df, new_rows):
+    touched = df[df['first_day_of_month'].isin(new_rows['first_day_of_month'].unique())]
+    return {
+        'national': merge_series(cube['national'], rollup(touched, [])),
+        'state': cube['state'].update(rollup(touched, ['state']), ['state']),
+        'county': cube['county'].update(rollup(touched, ['state', 'county']), ['state', 'county']),
+        'num_states': df.state.unique().size - 1,
+        'num_counties': df.county.unique().size,
+    }
+
+'''
+Function: Get the months of the data
+Parameters: mbd dataframe
+Returns: list of 'YYYY-MM-DD' strings in ascending order
+'''
+def get_month_list(df):
+    return pd.DatetimeIndex(df['first_day_of_month'].unique()).sort_values().strftime('%Y-%m-%d').tolist()
+
+'''
+Function: Look up the monthly series for a state or one of its counties
+Parameters: aggregate cube, selected state, selected county
+Returns: dataframe (first_day_of_month, active, microbusiness_density)
+'''
+def get_series(cube, selected_state, selected_county='All counties'):
+    if(selected_state == 'All States'):
+        return cube['national']
+    if(selected_county == 'All counties'):
+        series = cube['state'].get(selected_state)
+    else:
+        series = cube['county'].get((selected_state, selected_county))
+    if series is None:
+        return cube['national'].iloc[0:0]
+    return series
+
+'''
+Function: Build the county master table joining census data to each county's state and name
+Parameters: mbd dataframe, census dataframe
+Returns: dataframe with one row per cfips
+'''
+def build_county_master(df, census_df):
+    counties = df.drop_duplicates('cfips')[['cfips', 'county', 'state']]
+    return pd.merge(census_df, counties, how="inner", on=["cfips"]).reset_index(drop=True)
+
+'''
+Function: Index the county master table by state
+Parameters: county master dataframe
+Returns: dictionary of state -> county master rows, with 'All States' mapped to the full table
+'''
+def index_master_by_state(master_df):
+    master_by_state = {state: rows.reset_index(drop=True) for state, rows in master_df.groupby('state', observed=True)}
+    master_by_state['All States'] = master_df
+    return master_by_state
+
+'''
+Function: Get the county master rows for the selected state
+Parameters: state-indexed county master, selected state
+Returns: dataframe with one row per cfips in the state
+'''
+def get_master_slice(master_by_state, selected_state):
+    master_df = master_by_state.get(selected_state)
+    if master_df is None:
+        return master_by_state['All States'].iloc[0:0]
+    return master_df
+
+'''
+Function: Build the pre-sorted state and county dropdown lists
+Parameters: mbd dataframe
+Returns: dictionary with the states dropdown list and per-state county dropdown lists
+'''
+def build_place_index(df):
+    places = df.drop_duplicates(['state', 'county'])[['state', 'county']]
+    state_codes, state_names = pd.factorize(places['state'].astype(str), sort=True)
+    county_names = places['county'].astype(str).to_numpy()
+
+    # One sort groups counties by state and orders them by name inside each state
+    order = np.lexsort((county_names, state_codes))
+    county_names = county_names[order]
+    offsets = np.searchsorted(state_codes[order], np.arange(len(state_names) + 1))
+
+    counties = {}
+    for code, state in enumerate(state_names):
+        counties[state] = ['All counties'] + county_names[offsets[code]:offsets[code + 1]].tolist()
+
+    return {
+        'states': ['All States'] + state_names.tolist(),
+        'counties': counties,
+    }
+
+'''
+Function: Look up the county dropdown values of a state
+Parameters: place index, selected state
+Returns: list starting with 'All counties' followed by the state's counties in name order
+'''
+def get_state_counties(place_index, selected_state):
+    return place_index['counties'].get(selected_state, ['All counties'])
+
+'''
+Census metrics shown in the statistics card and the years available for each
+'''
+CENSUS_METRICS = ['pct_bb', 'pct_college', 'pct_it_workers', 'median_hh_inc']
+CENSUS_YEARS = ['2017', '2018', '2019', '2020', '2021']
+
+'''
+Function: Compute mean census values per (state, county, metric) for every year in one pass
+Parameters: county master dataframe
+Returns: dictionary of (state, county, metric) -> list of yearly means, with 'All counties' and 'All States' rollups
+'''
+def build_census_stats(master_df):
+    columns = [metric + '_' + year for metric in CENSUS_METRICS for year in CENSUS_YEARS]
+    long_df = master_df.melt(id_vars=['state', 'county'], value_vars=columns, var_name='column')
+    long_df['state'] = long_df['state'].astype(str)
+    long_df['county'] = long_df['county'].astype(str)
+    long_df['metric'] = long_df['column'].str[:-5]
+    long_df['year'] = long_df['column'].str[-4:]
+
+    county_means = long_df.groupby(['state', 'county', 'metric', 'year']).value.mean()
+    state_means = long_df.groupby(['state', 'metric', 'year']).value.mean()
+    national_means = long_df.groupby(['metric', 'year']).value.mean()
+
+    county_table = county_means.unstack('year')[CENSUS_YEARS]
+    state_table = state_means.unstack('year')[CENSUS_YEARS]
+    national_table = national_means.unstack('year')[CENSUS_YEARS]
+
+    stats = {}
+    for (state, county, metric), means in zip(county_table.index, county_table.to_numpy().tolist()):
+        stats[(state, county, metric)] = means
+    for (state, metric), means in zip(state_table.index, state_table.to_numpy().tolist()):
+        stats[(state, 'All counties', metric)] = means
+    for metric, means in zip(national_table.index, national_table.to_numpy().tolist()):
+        stats[('All States', 'All counties', metric)] = means
+    return stats
+
+'''
+Function: Look up the yearly census means for a state or county
+Parameters: census stats, selected state, selected county, metric prefix
+Returns: list of means, one per year in CENSUS_YEARS
+'''
+def get_census_means(stats, selected_state, selected_county, metric):
+    return stats.get((selected_state, selected_county, metric), [float('nan')] * len(CENSUS_YEARS))
@@ -1,112 +1,234 @@
 '''
 Import libraries
 '''
-from flask import Flask, request, render_template, redirect, url_for, jsonify
-import pandas as pd
-import numpy as np
-import plotly.express as px
-from urllib.request import urlopen
+import startup  # first, so its clock covers the imports below
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, jsonify, make_response, abort
 import json
+import logging
 import eda
+import datastore
+import geo
+import cache
+import fragments
+import prerender
+import forecasts
+import aggregates
+import instrumentation
+import render_pool
+import compression
+import refresh
+import lazy
+
+# pandas and plotly are imported by the first request or warm-up step that needs them
+plotly_offline = lazy.lazy_import('plotly.offline')
 
 '''
 Initialize Flask Application
 '''
 app = Flask(__name__)
 
+# Per-route and per-stage timings, exposed at /metrics
+instrumentation.init_app(app)
+instrumentation.instrument_module(eda)
+instrumentation.instrument_module(aggregates)
+instrumentation.instrument_module(datastore, ['load_dataset', 'read_csv_data', 'read_columnar_data'])
+instrumentation.instrument_module(geo, ['read_counties_geojson'])
+instrumentation.instrument_module(fragments, ['fig_to_html', 'fig_to_json'])
+
+# gzip/brotli for clients that accept it; registered after instrumentation so payload sizes are the bytes sent
+compression.init_app(app)
+
+# Stored compressed bodies are only requested again through ETags of the old data
+datastore.on_reload(lambda data: compression.compressed_cache.clear())
+
+# Render processes hold the dataset they were forked with
+datastore.on_reload(lambda data: render_pool.render_pool.reset())
+
+# Fragments written ahead of time by prerender.py
+prerendered_store = prerender.PrerenderedStore()
+
+# Forecast artifacts published by forecasts.py, swapped in without a restart
+forecast_registry = forecasts.ForecastRegistry()
+
 '''
-Function: Read mbd and census data
-Parameters: None
-Returns: mbd dataframe, census dataframe
+Function: Follow a dataset swap: after a full reload no rendered fragment is valid any more, after an
+incremental refresh the cached and prerendered fragments of views it did not change are kept
+Parameters: new Dataset
+Returns: None
 '''
-def read_data():
-    df = pd.read_csv('data/train.csv')
-    df['cfips'] = df['cfips'].apply(lambda x: '{0:0>5}'.format(x))
+def carry_over_fragments(data):
+    changes = data.changes
+    if changes is None:
+        cache.fragment_cache.clear()
+        return
+
+    def keep(route, params):
+        return not fragments.is_affected(route, params, changes)
+
+    def rekey(key):
+        version, route, params = key
+        if version == data.version:
+            return key
+        if version == changes['previous_version'] and keep(route, dict(params)):
+            return (data.version, route, params)
+        return None
+
+    cache.fragment_cache.remap(rekey)
+    prerendered_store.carry_over(changes['previous_fingerprint'], data.fingerprint, keep)
 
-    census_df = pd.read_csv('data/census_starter.csv')
-    census_df['cfips'] = census_df['cfips'].apply(lambda x: '{0:0>5}'.format(x))
+datastore.on_reload(carry_over_fragments)
 
-    return df, census_df
+# From the first dashboard import to a configured app
+startup.state.record_since('import', startup.IMPORT_STARTED)
 
 '''
-Index page
+Function: Get rendered fragments for a route from the fragment cache, the prerendered store or by building them
+Parameters: route name, 'html' or 'json', dataset snapshot (defaults to the current one), selected dropdown values
+Returns: dictionary of fragments
 '''
-@app.route('/', methods=['GET', 'POST'])
-def index():
+def get_fragments(route, fmt='html', data=None, **params):
+    if data is None:
+        data = datastore.get_dataset()
+    params['fmt'] = fmt
+    key = (data.version, route, tuple(sorted(params.items())))
+
+    def build():
+        with instrumentation.stage('prerender.lookup'):
+            prerendered = prerendered_store.get(data.fingerprint, route, params)
+        if prerendered is not None:
+            return prerendered
+        with instrumentation.stage('fragments.' + route):
+            if route == 'index':
+                return build_index_concurrently(data, params)
+            return render_pool.render_pool.build(data, route, params)
+
+    return cache.fragment_cache.get_or_build(key, build)
 
-    # Read data into a dataframe
-    df, census_df = read_data()
-    state_county_dict = eda.get_county_state_dict(df)
+'''
+Function: Build the landing page figures concurrently, each in a render process when the pool is enabled
+Parameters: Dataset, parameters of the index route
+Returns: dictionary of fragments
+'''
+def build_index_concurrently(data, params):
+    # Only runs on a cache miss, so the threads are not kept around (and never cross a fork)
+    with ThreadPoolExecutor(max_workers=len(fragments.INDEX_FIGURES), thread_name_prefix='index') as pool:
+        futures = [pool.submit(render_pool.render_pool.build, data, 'index_figure', dict(params, figure=figure))
+                   for figure in fragments.INDEX_FIGURES]
+        fragments_dict = {}
+        for future in futures:
+            fragments_dict.update(future.result())
+    return fragments_dict
 
-    # Get metrics for dashboard
-    num_states, num_counties, num_active_microbusinesses = eda.get_landing_page_metrics(df)
+'''
+Function: Load the data, geometry and forecast concurrently, then render the landing page, and mark the process ready
+Parameters: run in a background thread (requests are served meanwhile) instead of before returning
+Returns: None
+'''
+def warm_up(background=False):
+    startup.state.start([
+        [('dataset', datastore.get_dataset),
+         ('geometry', geo.get_county_geometry),
+         ('forecast', forecast_registry.get),
+         ('plotly', eda.px.load_module)],
+        [('prerendered', lambda: prerendered_store.load(datastore.get_dataset().fingerprint)),
+         ('landing', lambda: get_fragments('index', 'json'))],
+    ], background)
 
-    # Get list of states and counties
-    states, default_counties = eda.get_state_county_lists(df)
+'''
+Function: Get the version of the data that dashboard responses are built from, for their ETags
+Parameters: None
+Returns: source fingerprint of the current dataset (the same in every worker and across restarts), or its version
+'''
+def get_data_version():
+    data = datastore.get_dataset()
+    return data.fingerprint or data.version
 
-    # Get plot for 'Change in number of microbusinesses' part of the dashboard
-    plot_1 = eda.get_default_mbd_plot(df)
+'''
+Function: Get the version of the forecast served by /forecast, for its ETag
+Parameters: None
+Returns: id of the current forecast artifact, or None when nothing is published
+'''
+def get_forecast_version():
+    artifact = forecast_registry.get()
+    return artifact.metadata['artifact_id'] if artifact is not None else None
 
-    # Plot 2 - MBD Choropeth map
-    plot_2 = eda.get_mbd_choropleth(df)
+'''
+Function: Get the response format requested by the client
+Parameters: None
+Returns: 'json' for compact figure json (geometry served separately), otherwise 'html'
+'''
+def get_response_format():
+    return 'json' if request.args.get('format', type=str) == 'json' else 'html'
 
-    # Get lists of months and years
-    months, years = eda.get_years_months_lists(df)
+'''
+Function: Serialize a set of fragments as a json document
+Parameters: dictionary of fragments, response format
+Returns: json string
+'''
+def get_fragments_json(fragments_dict, fmt):
+    if fmt == 'html':
+        return json.dumps(fragments_dict)
 
-    # Broadband pct plot
-    broadband_plot = eda.get_pct_broadband_plot(df, census_df)
+    # Figures are already serialized json documents, so they are spliced in without re-encoding
+    return '{' + ','.join('{}:{}'.format(json.dumps(name), value) for name, value in fragments_dict.items()) + '}'
 
-    # College pct plot
-    college_plot = eda.get_pct_college_plot(df, census_df)
+'''
+Function: Create the json response for a set of fragments
+Parameters: dictionary of fragments, response format
+Returns: flask response
+'''
+def fragments_response(fragments_dict, fmt):
+    response = make_response(get_fragments_json(fragments_dict, fmt))
+    response.mimetype = 'application/json'
+    return response
 
-    # Workforce pct plot
-    workforce_plot = eda.get_pct_workforce_plot(df, census_df)
+'''
+Index page
+'''
+@app.route('/', methods=['GET', 'POST'])
+@compression.conditional(get_data_version)
+def index():
 
-    # Median Income plot
-    hh_income_plot = eda.get_hh_median_income_plot(df, census_df)
+    # Get data from the dataset store
+    data = datastore.get_dataset()
 
-    broadband_line_plot = eda.get_statistics_line_plots(df, census_df)
-    stats_types = ['Pct broadband', 'Pct college degree', 'Pct IT workforce', 'Median household income']
+    # Get metrics for dashboard
+    num_states, num_counties, num_active_microbusinesses = eda.get_landing_page_metrics(data.cube)
+
+    # Get list of states and counties
+    states, default_counties = eda.get_state_county_lists(data.places)
+
+    # Get lists of months and years
+    months, years = eda.get_years_months_lists(data.months)
 
     return render_template('index.html', num_states = num_states, num_counties = num_counties,
-    num_microbusinesses = num_active_microbusinesses, default_plot=plot_1.to_html(full_html=False),
-    states = states, default_counties = default_counties, state_county_dict = state_county_dict,
-    density_plot=plot_2.to_html(full_html=False), months = months, years = years,
-    broadband_plot = broadband_plot.to_html(full_html=False),
-    college_plot = college_plot.to_html(full_html=False),
-    workforce_plot = workforce_plot.to_html(full_html=False),
-    hh_income_plot = hh_income_plot.to_html(full_html=False),
-    broadband_line_plot = broadband_line_plot.to_html(full_html=False),
-    # college_line_plot = college_line_plot.to_html(full_html=False),
-    # workforce_line_plot = workforce_line_plot.to_html(full_html=False),
-    # hh_income_line_plot = hh_income_line_plot.to_html(full_html=False),
-    stats_types = stats_types
+    num_microbusinesses = num_active_microbusinesses,
+    states = states, default_counties = default_counties,
+    months = months, years = years,
+    stats_types = fragments.STATS_TYPES,
+    plotlyjs_version = plotly_offline.get_plotlyjs_version(),
+    **get_fragments('index', 'json')
     )
 
 '''
 Update county dropdown and plot for MBD line plot
 '''
 @app.route('/update_county_dropdown')
+@compression.conditional(get_data_version)
 def update_county_dropdown():
 
     # The value of the first dropdown (selected by the user)
     selected_state = request.args.get('selected_state', type=str)
 
-    df, census_df = read_data()
-
-    fig, counties_list = eda.get_updated_county_list(selected_state, df, census_df)
-
-    # Create the value sin the dropdown as a html string
-    html_string_selected = ''
-    for entry in counties_list:
-        html_string_selected += '<option value="{}">{}</option>'.format(entry, entry)
-
-    return jsonify(html_string_selected = html_string_selected, state_plot = fig.to_html(full_html=False))
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_county_dropdown', fmt, state=selected_state), fmt)
 
 '''
 Update plot for MBD line plot
 '''
 @app.route('/update_plot')
+@compression.conditional(get_data_version)
 def update_plot():
 
     # The value of the first dropdown (selected by the user)
@@ -115,16 +237,14 @@ def update_plot():
     # The value of the second dropdown (selected by the user)
     selected_county = request.args.get('selected_county', type=str)
 
-    df, census_df = read_data()
-    
-    fig = eda.get_updated_mbd_line_plot(selected_state, selected_county, df, census_df)
-
-    return jsonify(county_plot = fig.to_html(full_html=False))
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_plot', fmt, state=selected_state, county=selected_county), fmt)
 
 '''
 Update MBD choropleth
 '''
 @app.route('/update_density_plot')
+@compression.conditional(get_data_version)
 def update_density_plot():
 
     # The value of the state dropdown (selected by the user)
@@ -133,15 +253,14 @@ def update_density_plot():
     # The value of the month dropdown (selected by the user)
     selected_month = request.args.get('selected_month', type=str)
 
-    df, census_df = read_data()    
-    fig = eda.get_updated_mbd_choropleth(selected_state, selected_month, df, census_df)
-
-    return jsonify(density_plot = fig.to_html(full_html=False))
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_density_plot', fmt, state=selected_state, month=selected_month), fmt)
 
 '''
 Update other metrics choropleth
 '''
 @app.route('/update_metrics_plots')
+@compression.conditional(get_data_version)
 def update_metrics_plots():
 
     # The value of the state dropdown (selected by the user)
@@ -150,18 +269,14 @@ def update_metrics_plots():
     # The value of the month dropdown (selected by the user)
     selected_year = request.args.get('selected_year', type=str)
 
-    df, census_df = read_data()
-    broadband_plot, college_plot, workforce_plot, hh_income_plot = eda.get_updated_metrics_choropleths(selected_state, selected_year, df, census_df)
-    
-    return jsonify(broadband_plot = broadband_plot.to_html(full_html=False),
-    college_plot = college_plot.to_html(full_html=False),
-    workforce_plot = workforce_plot.to_html(full_html=False),
-    income_plot = hh_income_plot.to_html(full_html=False))
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_metrics_plots', fmt, state=selected_state, year=selected_year), fmt)
 
 '''
 Update county dropdown and plot for stats line plots
 '''
 @app.route('/update_stats_county_dropdown')
+@compression.conditional(get_data_version)
 def update_stats_county_dropdown():
 
     # The value of the first dropdown (selected by the user)
@@ -170,22 +285,15 @@ def update_stats_county_dropdown():
     # The value of the third dropdown (selected by the user)
     selected_type = request.args.get('selected_type', type=str)
 
-    df, census_df = read_data()
-
-    fig, counties_list = eda.get_updated_stats_county_list(selected_state, selected_type, df, census_df)
-
-    # Create the value sin the dropdown as a html string
-    html_string_selected = ''
-    for entry in counties_list:
-        html_string_selected += '<option value="{}">{}</option>'.format(entry, entry)
-
-    return jsonify(html_string_selected = html_string_selected, 
-    plot = fig.to_html(full_html=False))
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_stats_county_dropdown', fmt, state=selected_state, stats_type=selected_type), fmt)
 
 '''
 Update plots for stats line plots
 '''
 @app.route('/update_stats_plot')
+@app.route('/update_stats_plot_type')
+@compression.conditional(get_data_version)
 def update_stats_plot():
 
     # The value of the first dropdown (selected by the user)
@@ -197,32 +305,126 @@ def update_stats_plot():
     # The value of the third dropdown (selected by the user)
     selected_type = request.args.get('selected_type', type=str)
 
-    df, census_df = read_data()
-    
-    fig= eda.get_updated_stats_line_plot(selected_state, selected_county, selected_type, df, census_df)
+    fmt = get_response_format()
+    return fragments_response(get_fragments('update_stats_plot', fmt, state=selected_state, county=selected_county, stats_type=selected_type), fmt)
 
-    return jsonify(plot = fig.to_html(full_html=False))
+'''
+Update several dashboard panels in one request
+Query parameters: panels (comma separated names from fragments.PANELS, default all),
+the dashboard state (state, county, density_state, month, metrics_state, year, stats_state, stats_county, stats_type)
+and format
+'''
+@app.route('/update_dashboard')
+@compression.conditional(get_data_version)
+def update_dashboard():
+    fmt = get_response_format()
+    panels = request.args.get('panels', ','.join(fragments.PANELS), type=str).split(',')
+    if any(panel not in fragments.PANELS for panel in panels):
+        abort(400)
+    dashboard_state = request.args.to_dict()
+
+    # A panel whose dashboard state is incomplete is a bad request, not a failed render
+    if any(source not in dashboard_state for panel in panels for source in fragments.PANELS[panel][1].values()):
+        abort(400)
+
+    # Every panel is served from the same dataset snapshot and its shared tables
+    data = datastore.get_dataset()
+    panel_json = []
+    for panel in panels:
+        route, params = fragments.get_panel_route(panel, dashboard_state)
+        panel_json.append('{}:{}'.format(json.dumps(panel), get_fragments_json(get_fragments(route, fmt, data, **params), fmt)))
+
+    response = make_response('{' + ','.join(panel_json) + '}')
+    response.mimetype = 'application/json'
+    return response
 
 '''
-Update plots for stats line plots
+County geometry, served once per client and cached by the browser
 '''
-@app.route('/update_stats_plot_type')
-def update_stats_plot_type():
+@app.route('/geojson/<name>.json')
+def geojson(name):
+    payload = geo.get_county_geometry().get_payload(name)
+    if payload is None:
+        abort(404)
+    body, gzipped_body, etag = payload
+
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = make_response(gzipped_body)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(body)
+    response.mimetype = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
-    # The value of the first dropdown (selected by the user)
-    selected_state = request.args.get('selected_state', type=str)
+'''
+Forecast of the nation, a state or a county from the current forecast artifact
+Query parameters: selected_state (default 'All States'), selected_county (default 'All counties')
+'''
+@app.route('/forecast')
+@compression.conditional(get_forecast_version)
+def forecast():
+    artifact = forecast_registry.get()
+    if artifact is None:
+        abort(404)
+
+    selected_state = request.args.get('selected_state', 'All States', type=str)
+    selected_county = request.args.get('selected_county', 'All counties', type=str)
+    result = artifact.get_forecast(selected_state, selected_county)
+    if result is None:
+        abort(404)
+    return jsonify(artifact=artifact.metadata['artifact_id'], model=artifact.metadata['model'],
+                   months=artifact.months, **result)
 
-    # The value of the second dropdown (selected by the user)
-    selected_county = request.args.get('selected_county', type=str)
+'''
+Readiness probe: 200 once this process has loaded its data and rendered the landing page, 503 until then;
+starts the warm-up in the background if nothing started it (e.g. flask run or a test client)
+'''
+@app.route('/ready')
+def ready():
+    if not startup.state.started:
+        warm_up(background=True)
+    response = jsonify(**startup.state.to_dict())
+    response.status_code = 200 if startup.state.ready.is_set() else 503
+    return response
 
-    # The value of the third dropdown (selected by the user)
-    selected_type = request.args.get('selected_type', type=str)
+'''
+Timing histograms per route and stage, payload sizes, cache counters and startup timings
+'''
+@app.route('/metrics')
+def metrics():
+    return jsonify(cache=cache.fragment_cache.stats(), compressed_cache=compression.compressed_cache.stats(),
+                   startup=startup.state.to_dict(), **instrumentation.metrics.to_dict())
 
-    df, census_df = read_data()
-    
-    fig = eda.get_updated_stats_line_plot(selected_state, selected_county, selected_type, df, census_df)
+'''
+Load the rows appended to train.csv since the last load or refresh
+Requires the header Authorization: Bearer <MBD_ADMIN_TOKEN>; refreshes this worker process, then touches the
+trigger file so the other workers' watchers refresh within a second
+'''
+@app.route('/admin/refresh', methods=['POST'])
+def admin_refresh():
+    if refresh.ADMIN_TOKEN is None:
+        abort(404)
+    if not refresh.is_authorized(request):
+        abort(403)
+    summary = refresh.run_refresh()
+    refresh.trigger_refresh()
+    return jsonify(**summary)
 
-    return jsonify(plot = fig.to_html(full_html=False))
+'''
+Fragment cache counters
+'''
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(**cache.fragment_cache.stats())
 
 if __name__ == '__main__':
-    app.run(debug = True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+
+    # Serve at once; the datasets, county geometry and landing page load in the background
+    warm_up(background=True)
+    refresh.watcher.start()
+    app.run(debug = True)
@@ -0,0 +1,117 @@
+'''
+Import libraries
+'''
+import os
+import threading
+from collections import OrderedDict
+
+'''
+Class: Size bounded LRU cache of rendered dashboard fragments
+Attributes: maximum number of entries, maximum total bytes, hit/miss/eviction counters
+'''
+class FragmentCache:
+    def __init__(self, max_entries=512, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    '''
+    Function: Get a cached value and mark it as recently used
+    Parameters: cache key
+    Returns: cached value or None
+    '''
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    '''
+    Function: Store a value, evicting least recently used entries to stay within bounds
+    Parameters: cache key, value, size of the value in bytes
+    Returns: None
+    '''
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    '''
+    Function: Get a dictionary of rendered fragments, building and caching it on a miss
+    Parameters: cache key, function returning a dictionary of html/json strings
+    Returns: dictionary of fragments
+    '''
+    def get_or_build(self, key, build):
+        fragments = self.get(key)
+        if fragments is None:
+            fragments = build()
+            self.put(key, fragments, sum(len(value) for value in fragments.values()))
+        return fragments
+
+    '''
+    Function: Re-key every entry, dropping those the function maps to None
+    Parameters: function from old key to new key or None
+    Returns: number of entries kept
+    '''
+    def remap(self, function):
+        with self.lock:
+            entries = OrderedDict()
+            for key, (value, size) in self.entries.items():
+                new_key = function(key)
+                if new_key is None:
+                    self.total_bytes -= size
+                else:
+                    entries[new_key] = (value, size)
+            self.entries = entries
+            return len(entries)
+
+    '''
+    Function: Drop every cached entry
+    Parameters: None
+    Returns: None
+    '''
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    '''
+    Function: Get cache counters
+    Parameters: None
+    Returns: dictionary of counters
+    '''
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+'''
+Shared cache of rendered fragments for the Flask routes
+'''
+fragment_cache = FragmentCache(max_entries=int(os.environ.get('MBD_CACHE_MAX_ENTRIES', 512)),
+                               max_bytes=int(os.environ.get('MBD_CACHE_MAX_BYTES', 512 * 1024 * 1024)))
@@ -0,0 +1,146 @@
+'''
+Import libraries
+'''
+import functools
+import gzip
+import hashlib
+import os
+from flask import g, request, make_response
+import cache
+
+# Brotli is used when the brotli package is installed, gzip otherwise
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+'''
+Bodies smaller than MBD_COMPRESS_MIN_BYTES are sent as is; compressed bodies of MBD_PRECOMPRESS_MIN_BYTES
+or more are compressed harder, once, and kept in a bounded cache keyed by their ETag
+'''
+COMPRESS_MIN_BYTES = int(os.environ.get('MBD_COMPRESS_MIN_BYTES', 1024))
+PRECOMPRESS_MIN_BYTES = int(os.environ.get('MBD_PRECOMPRESS_MIN_BYTES', 64 * 1024))
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+'''
+Compressed bodies of large responses, shared by every request that gets the same ETag and encoding
+'''
+compressed_cache = cache.FragmentCache(max_entries=int(os.environ.get('MBD_COMPRESSED_CACHE_MAX_ENTRIES', 1024)),
+                                       max_bytes=int(os.environ.get('MBD_COMPRESSED_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+
+'''
+Function: Fingerprint the dashboard's code and templates, so a deploy invalidates the ETags of the previous one
+Parameters: dashboard directory
+Returns: hex digest of the names, sizes and modification times of the python files and templates
+'''
+def get_build_id(directory=os.path.dirname(os.path.abspath(__file__))):
+    digest = hashlib.sha1()
+    for folder in (directory, os.path.join(directory, 'templates')):
+        if os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(('.py', '.html')):
+                    stat = os.stat(os.path.join(folder, name))
+                    digest.update('{}:{}:{};'.format(name, stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+BUILD_ID = get_build_id()
+
+'''
+Function: Compute the ETag of the current request
+Parameters: version of the data the response is built from
+Returns: hex digest of the code build, the data version, the path and the sorted query parameters
+'''
+def get_etag(version):
+    digest = hashlib.sha1('{}|{}|{}'.format(BUILD_ID, version, request.path).encode())
+    for name, value in sorted(request.args.items(multi=True)):
+        digest.update('|{}={}'.format(name, value).encode())
+    return digest.hexdigest()
+
+'''
+Function: Make a view answer conditional GETs: its responses carry an ETag and a repeat request gets a 304 without building anything
+Parameters: function returning the version of the data the view reads (None skips the ETag)
+Returns: decorator
+'''
+def conditional(get_version):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = get_version() if request.method in ('GET', 'HEAD') else None
+            if version is None:
+                return view(*args, **kwargs)
+
+            # Weak, so one ETag covers the identity, gzip and brotli encodings of the body
+            etag = get_etag(version)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                g.mbd_etag = etag
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+'''
+Function: Pick the response encoding from the request's Accept-Encoding header
+Parameters: None
+Returns: 'br', 'gzip' or None
+'''
+def get_encoding():
+    accept_encodings = request.accept_encodings
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+'''
+Function: Compress a body
+Parameters: body bytes, 'br' or 'gzip', compress harder because the result is kept
+Returns: compressed bytes
+'''
+def compress(body, encoding, precompress=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=9 if precompress else 5)
+    return gzip.compress(body, 9 if precompress else 6)
+
+'''
+Function: Compress a response for clients that accept it, reusing the stored compressed body of a large response
+Parameters: flask response
+Returns: flask response
+'''
+def after_request(response):
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = get_encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    # Only bodies named by an ETag from conditional() can be stored: the ETag determines the body
+    etag = g.get('mbd_etag')
+    if etag is not None and len(body) >= PRECOMPRESS_MIN_BYTES:
+        key = (etag, encoding)
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding, precompress=True)
+            compressed_cache.put(key, compressed, len(compressed))
+    else:
+        compressed = compress(body, encoding)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+'''
+Function: Register the compression hook on a Flask app
+Parameters: flask app
+Returns: None
+'''
+def init_app(app):
+    app.after_request(after_request)
@@ -0,0 +1,368 @@
+'''
+Import libraries
+'''
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from importlib.util import find_spec
+import aggregates
+import lazy
+
+'''
+Function: Enable copy-on-write on pandas versions where it is optional
+Parameters: pandas module
+Returns: None
+'''
+def enable_copy_on_write(pandas):
+    # Views handed to the eda functions share memory with the store; with copy-on-write any accidental
+    # mutation copies instead of writing through to the shared frames. pandas 3 always copies on write
+    # and deprecates the option.
+    if int(pandas.__version__.split('.')[0]) < 3:
+        pandas.set_option('mode.copy_on_write', True)
+
+pd = lazy.lazy_import('pandas', enable_copy_on_write)
+
+# Columnar copies of the data (common/columnar.py) are used when pyarrow is installed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+columnar = lazy.lazy_import('columnar') if find_spec('pyarrow') is not None else None
+
+'''
+Location of the csv files, overridable for deployments that mount data elsewhere
+'''
+DATA_DIR = os.environ.get('MBD_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+'''
+Sources of a snapshot, each read from its csv file or, without one, its columnar copy; the census data is
+only re-read by a full reload
+'''
+SOURCE_NAMES = ('train', 'census_starter')
+CENSUS_NAMES = ('census_starter',)
+
+# Bytes of train.csv before the read position that must not change for a refresh to only read what follows
+TAIL_BYTES = 4096
+
+# Content digests of source files by path, with the size and modification time they were computed for
+_file_digests = {}
+
+_lock = threading.Lock()
+_current = None
+_reload_callbacks = []
+
+# Where the next refresh reads from: kept by the store, since snapshots are never changed once built
+_source = None
+
+'''
+Class: One loaded snapshot of the mbd and census data; a refresh builds a new snapshot instead of changing this one
+Attributes: mbd dataframe, census dataframe, version number, source fingerprint, load timestamp, derived tables,
+what changed since the previous version (None after a full load)
+'''
+class Dataset:
+    def __init__(self, df, census_df, version, fingerprint=None, tables=None):
+        self.df = df
+        self.census_df = census_df
+        self.version = version
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self.memo_values = {}
+        self.memo_lock = threading.Lock()
+        self.changes = None
+
+        # Derived tables are built once per load and shared by every request
+        if tables is None:
+            master_df = aggregates.build_county_master(df, census_df)
+            tables = {'cube': aggregates.build_aggregate_cube(df),
+                      'master_by_state': aggregates.index_master_by_state(master_df),
+                      'census_stats': aggregates.build_census_stats(master_df),
+                      'places': aggregates.build_place_index(df),
+                      'months': aggregates.get_month_list(df)}
+        self.cube = tables['cube']
+        self.master_by_state = tables['master_by_state']
+        self.census_stats = tables['census_stats']
+        self.places = tables['places']
+        self.months = tables['months']
+
+    '''
+    Function: Build the next snapshot from this one plus new mbd rows, updating the derived tables incrementally
+    Parameters: new rows typed like self.df, source fingerprint
+    Returns: new Dataset whose changes name the months touched and whether counties were added
+    '''
+    def extend(self, rows, fingerprint):
+        df, rows = append_rows(self.df, rows)
+        months = aggregates.get_month_list(rows)
+        new_counties = not set(rows['cfips'].tolist()) <= set(self.df['cfips'].unique().tolist())
+
+        tables = {'cube': aggregates.update_aggregate_cube(self.cube, df, rows),
+                  'master_by_state': self.master_by_state,
+                  'census_stats': self.census_stats,
+                  'places': self.places,
+                  'months': sorted(set(self.months).union(months))}
+        if new_counties:
+            # Rare, and the census tables are small: rebuild them rather than patch them
+            master_df = aggregates.build_county_master(df, self.census_df)
+            tables.update(master_by_state=aggregates.index_master_by_state(master_df),
+                          census_stats=aggregates.build_census_stats(master_df),
+                          places=aggregates.build_place_index(df))
+
+        data = Dataset(df, self.census_df, self.version + 1, fingerprint, tables)
+        data.changes = {'previous_version': self.version, 'previous_fingerprint': self.fingerprint,
+                        'rows': len(rows), 'months': months, 'new_counties': new_counties}
+        return data
+
+    '''
+    Function: Get a value derived from this snapshot, computing it on first use
+    Parameters: name of the value, function computing it
+    Returns: the derived value
+    '''
+    def memo(self, name, build):
+        if name not in self.memo_values:
+            value = build()
+            with self.memo_lock:
+                self.memo_values.setdefault(name, value)
+        return self.memo_values[name]
+
+'''
+Function: Zero-pad a column of county fips codes
+Parameters: integer cfips series
+Returns: five character string series
+'''
+def pad_cfips(cfips):
+    return cfips.astype('int64').astype(str).str.zfill(5)
+
+'''
+Function: Read mbd and census csv files into typed dataframes
+Parameters: data directory
+Returns: mbd dataframe, census dataframe
+'''
+def read_csv_data(data_dir=DATA_DIR):
+    df = pd.read_csv(os.path.join(data_dir, 'train.csv'),
+                     dtype={'cfips': 'int64', 'county': 'category', 'state': 'category'},
+                     parse_dates=['first_day_of_month'])
+    df['cfips'] = pad_cfips(df['cfips'])
+
+    census_df = pd.read_csv(os.path.join(data_dir, 'census_starter.csv'))
+    census_df['cfips'] = pad_cfips(census_df['cfips'])
+
+    return df, census_df
+
+'''
+Function: Digest the content of a file, reusing the digest while its size and modification time are unchanged
+Parameters: file path
+Returns: hex digest
+'''
+def get_file_digest(path):
+    stat = os.stat(path)
+    cached = _file_digests.get(path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    _file_digests[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+    return digest.hexdigest()
+
+'''
+Function: Fingerprint the source files so artifacts built from them can be matched across processes and hosts
+Parameters: data directory, source names
+Returns: hex digest of the content of each source's csv file (its columnar copy when there is no csv file)
+'''
+def get_data_fingerprint(data_dir=DATA_DIR, names=SOURCE_NAMES):
+    digest = hashlib.sha1()
+    for name in names:
+        for file_name in (name + '.csv', name + '.feather'):
+            path = os.path.join(data_dir, file_name)
+            if os.path.exists(path):
+                digest.update('{}:{};'.format(file_name, get_file_digest(path)).encode())
+                break
+    return digest.hexdigest()
+
+'''
+Function: Read mbd and census data from their columnar copies, decoding only the columns the dashboard uses
+Parameters: data directory
+Returns: mbd dataframe, census dataframe
+'''
+def read_columnar_data(data_dir=DATA_DIR):
+    df = columnar.read_columnar(data_dir, 'train',
+                                ['row_id', 'fips', 'county', 'state', 'first_day_of_month', 'microbusiness_density', 'active'])
+    df = df.rename(columns={'fips': 'cfips'})
+
+    census_df = columnar.read_columnar(data_dir, 'census_starter')
+    census_df = census_df.drop(columns=['cfips']).rename(columns={'fips': 'cfips'})
+
+    return df, census_df
+
+'''
+Function: Check whether the columnar copies of the data can be used
+Parameters: data directory
+Returns: True if pyarrow is available and both columnar files are up to date
+'''
+def use_columnar(data_dir=DATA_DIR):
+    return columnar is not None and all(columnar.has_columnar(data_dir, name) for name in ('train', 'census_starter'))
+
+'''
+Function: Load a new dataset snapshot from disk
+Parameters: data directory, version number
+Returns: Dataset
+'''
+def load_dataset(data_dir=DATA_DIR, version=1):
+    # Imported here even when the columnar reader does the reading, so copy-on-write is set before any view exists
+    pd.load_module()
+
+    fingerprint = get_data_fingerprint(data_dir)
+    if use_columnar(data_dir):
+        df, census_df = read_columnar_data(data_dir)
+    else:
+        df, census_df = read_csv_data(data_dir)
+    return Dataset(df, census_df, version, fingerprint)
+
+'''
+Function: Digest the bytes of a file just before an offset, to notice a rewrite of what was already read
+Parameters: file path, offset, number of bytes
+Returns: hex digest, or None when the offset is not at the end of a line
+'''
+def get_tail_digest(path, offset, size=TAIL_BYTES):
+    start = max(offset - size, 0)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        tail = f.read(offset - start)
+    if tail and not tail.endswith(b'\n'):
+        return None
+    return hashlib.sha1(tail).hexdigest()
+
+'''
+Function: Record where a refresh of the data directory starts reading, taken before a full load reads it
+Parameters: data directory
+Returns: dictionary of data directory, bytes of train.csv, digest of their tail and census fingerprint
+'''
+def get_source(data_dir):
+    # Rows appended while the load reads are read again by the next refresh and skipped there
+    path = os.path.join(data_dir, 'train.csv')
+    offset = os.path.getsize(path)
+    return {'data_dir': data_dir, 'offset': offset, 'tail': get_tail_digest(path, offset),
+            'census_fingerprint': get_data_fingerprint(data_dir, CENSUS_NAMES)}
+
+'''
+Function: Read the rows appended to train.csv after a byte offset
+Parameters: data directory, bytes already loaded
+Returns: dataframe of the new complete lines, bytes loaded after them
+'''
+def read_appended_rows(data_dir, data_offset):
+    with open(os.path.join(data_dir, 'train.csv'), 'rb') as f:
+        header = f.readline()
+        f.seek(data_offset)
+        appended = f.read()
+
+    # A partly written last line is left for the next refresh
+    appended = appended[:appended.rfind(b'\n') + 1]
+    rows = pd.read_csv(io.BytesIO(header + appended), dtype={'cfips': 'int64'}, parse_dates=['first_day_of_month'])
+    rows['cfips'] = pad_cfips(rows['cfips'])
+    return rows, data_offset + len(appended)
+
+'''
+Function: Append new rows to the mbd dataframe, keeping its column order and types
+Parameters: mbd dataframe, new rows
+Returns: combined dataframe, new rows typed like it
+'''
+def append_rows(df, rows):
+    rows = rows[list(df.columns)].copy()
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = rows[column].astype(str)
+            added = sorted(set(values.unique()) - set(dtype.categories))
+            if added:
+                # New states or counties extend the categories; existing codes keep their meaning
+                dtype = pd.CategoricalDtype(dtype.categories.append(pd.Index(added)))
+                df = df.assign(**{column: df[column].cat.set_categories(dtype.categories)})
+            rows[column] = pd.Categorical(values, dtype=dtype)
+        else:
+            rows[column] = rows[column].astype(dtype)
+    return pd.concat([df, rows], ignore_index=True), rows
+
+'''
+Function: Get the shared dataset, loading it on first use
+Parameters: data directory to load from on first use
+Returns: Dataset
+'''
+def get_dataset(data_dir=DATA_DIR):
+    global _current, _source
+    data = _current
+    if data is None:
+        with _lock:
+            if _current is None:
+                source = get_source(data_dir)
+                _current = load_dataset(data_dir)
+                _source = source
+            data = _current
+    return data
+
+'''
+Function: Register a function to call after a new snapshot is swapped in
+Parameters: callback taking the new Dataset
+Returns: the callback
+'''
+def on_reload(callback):
+    _reload_callbacks.append(callback)
+    return callback
+
+'''
+Function: Re-read the data directory and swap in the new snapshot
+Parameters: data directory
+Returns: Dataset
+'''
+def reload_dataset(data_dir=DATA_DIR):
+    global _current, _source
+    with _lock:
+        version = _current.version + 1 if _current is not None else 1
+        source = get_source(data_dir)
+        _current = load_dataset(data_dir, version)
+        _source = source
+        data = _current
+    for callback in _reload_callbacks:
+        callback(data)
+    return data
+
+'''
+Function: Load only the rows appended to train.csv since the current snapshot and swap in the extended snapshot;
+falls back to a full reload when what was already read changed (train.csv rewritten or the census files changed)
+Parameters: None
+Returns: new Dataset, or None when nothing new was appended
+'''
+def refresh_dataset():
+    global _current, _source
+    with _lock:
+        current, source = _current, _source
+        if current is None or source is None:
+            return None
+        data_dir = source['data_dir']
+        path = os.path.join(data_dir, 'train.csv')
+        size = os.path.getsize(path)
+        rewritten = (size < source['offset']
+                     or get_tail_digest(path, source['offset']) != source['tail']
+                     or get_data_fingerprint(data_dir, CENSUS_NAMES) != source['census_fingerprint'])
+        if not rewritten and size == source['offset']:
+            return None
+
+        # A load that stopped inside a line cannot be continued from there
+        rewritten = rewritten or source['tail'] is None
+        if not rewritten:
+            fingerprint = get_data_fingerprint(data_dir)
+            rows, offset = read_appended_rows(data_dir, source['offset'])
+            _source = dict(source, offset=offset, tail=get_tail_digest(path, offset))
+
+            # Rows already in the snapshot (appended while it was being loaded) are skipped
+            known = set(current.df.loc[current.df['first_day_of_month'].isin(rows['first_day_of_month'].unique()), 'row_id'].tolist())
+            rows = rows[[row_id not in known for row_id in rows['row_id'].tolist()]]
+            if not len(rows):
+                return None
+
+            # Readers keep whichever snapshot they already hold; the swap is a single assignment
+            data = current.extend(rows, fingerprint)
+            _current = data
+    if rewritten:
+        return reload_dataset(data_dir)
+    for callback in _reload_callbacks:
+        callback(data)
+    return data
@@ -0,0 +1,227 @@
+'''
+Forecast artifacts served by the dashboard.
+
+Usage: python forecasts.py SUBMISSION_CSV --model NAME [--root DIR]
+
+An artifact is a directory under DIR (default dashboard/forecasts, or MBD_FORECAST_DIR):
+  metadata.json           format version, model name, months, states and counties
+  cfips.npy               int32 county codes, one per row
+  state_codes.npy         int32 index into metadata['states'] of each row
+  forecast.npy            float64 counties x months density forecast
+  state_forecast.npy      float64 states x months mean density, precomputed
+  national_forecast.npy   float64 months mean density, precomputed
+DIR/CURRENT names the artifact being served. Publishing writes a new artifact and then
+replaces CURRENT, and the running app picks it up on its next request; arrays are
+memory-mapped, so serving needs neither the models nor the submission file.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+import datastore
+import lazy
+
+np = lazy.lazy_import('numpy')
+pd = lazy.lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FORECAST_DIR = os.environ.get('MBD_FORECAST_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'forecasts'))
+
+# How often the registry looks at the CURRENT pointer, in seconds
+CHECK_INTERVAL = 1.0
+
+'''
+Function: Convert a forecast series to a JSON-safe list
+Parameters: 1-D array
+Returns: list of floats, None where the value is missing (NaN is not valid JSON)
+'''
+def to_json_list(array):
+    return [value if math.isfinite(value) else None for value in array.tolist()]
+
+'''
+Class: One forecast artifact with its arrays memory-mapped and its rows indexed by state and county
+Attributes: artifact directory, metadata, cfips, state codes, forecast arrays, row lookups
+'''
+class ForecastArtifact:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'metadata.json')) as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('format_version') != FORMAT_VERSION:
+            raise ValueError('Unsupported forecast artifact format {} in {}'.format(self.metadata.get('format_version'), path))
+
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                  for name in ('cfips', 'state_codes', 'forecast', 'state_forecast', 'national_forecast')}
+        self.cfips = arrays['cfips']
+        self.state_codes = arrays['state_codes']
+        self.forecast = arrays['forecast']
+        self.state_forecast = arrays['state_forecast']
+        self.national_forecast = arrays['national_forecast']
+
+        self.months = self.metadata['months']
+        self.states = self.metadata['states']
+        self.state_index = {state: i for i, state in enumerate(self.states)}
+        self.county_rows = {}
+        self.state_rows = {}
+        for row, (code, county) in enumerate(zip(self.state_codes.tolist(), self.metadata['counties'])):
+            self.county_rows[(self.states[code], county)] = row
+            self.state_rows.setdefault(self.states[code], []).append(row)
+
+    '''
+    Function: Get the forecast of the nation, a state, or a county
+    Parameters: selected state, selected county
+    Returns: dictionary of the place's series plus the series one level down, or None if unknown
+    '''
+    def get_forecast(self, selected_state='All States', selected_county='All counties'):
+        if selected_state == 'All States':
+            return {'place': 'All States',
+                    'forecast': to_json_list(self.national_forecast),
+                    'states': {state: to_json_list(self.state_forecast[i]) for i, state in enumerate(self.states)}}
+
+        state_index = self.state_index.get(selected_state)
+        if state_index is None:
+            return None
+        if selected_county == 'All counties':
+            rows = self.state_rows[selected_state]
+            counties = self.metadata['counties']
+            return {'place': selected_state,
+                    'forecast': to_json_list(self.state_forecast[state_index]),
+                    'counties': {counties[row]: to_json_list(self.forecast[row]) for row in rows}}
+
+        row = self.county_rows.get((selected_state, selected_county))
+        if row is None:
+            return None
+        return {'place': selected_county,
+                'cfips': datastore.pad_cfips(pd.Series([self.cfips[row]]))[0],
+                'forecast': to_json_list(self.forecast[row])}
+
+'''
+Class: Serves the current forecast artifact and swaps to a newly published one without a restart
+Attributes: registry directory, current artifact, the last CURRENT pointer seen (loaded or failed) and when it was read
+'''
+class ForecastRegistry:
+    def __init__(self, root=FORECAST_DIR):
+        self.root = root
+        self.artifact = None
+        self.pointer = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    '''
+    Function: Read the CURRENT pointer
+    Parameters: None
+    Returns: artifact id or None
+    '''
+    def read_pointer(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    '''
+    Function: Get the current artifact, loading a newly published one when CURRENT changed; an artifact
+    that fails to load is logged once and the previous one is kept
+    Parameters: None
+    Returns: ForecastArtifact or None when nothing is published
+    '''
+    def get(self):
+        now = time.time()
+        if now - self.checked_at < CHECK_INTERVAL:
+            return self.artifact
+        with self.lock:
+            if now - self.checked_at >= CHECK_INTERVAL:
+                pointer = self.read_pointer()
+                if pointer != self.pointer:
+                    # The old artifact stays mapped until requests holding it finish
+                    try:
+                        self.artifact = ForecastArtifact(os.path.join(self.root, pointer)) if pointer is not None else None
+                    except Exception:
+                        logger.exception('Cannot load forecast artifact %s; still serving %s', pointer,
+                                         self.artifact.metadata['artifact_id'] if self.artifact is not None else 'nothing')
+                    # A bad pointer is remembered, so it is not retried until CURRENT changes again
+                    self.pointer = pointer
+                self.checked_at = time.time()
+        return self.artifact
+
+'''
+Function: Read a submission-shaped csv into a counties x months array
+Parameters: csv path with row_id (cfips_YYYY-MM-DD) and microbusiness_density
+Returns: cfips array, list of month strings, counties x months array
+'''
+def read_submission(path):
+    submission = pd.read_csv(path)
+    parts = submission['row_id'].str.split('_', n=1, expand=True)
+    cfips, county_index = np.unique(parts[0].astype('int64').to_numpy(), return_inverse=True)
+    months, month_index = np.unique(parts[1].to_numpy(), return_inverse=True)
+    forecast = np.full((len(cfips), len(months)), np.nan)
+    forecast[county_index, month_index] = submission['microbusiness_density'].to_numpy(dtype='float64')
+    return cfips, [str(month) for month in months], forecast
+
+'''
+Function: Write a new artifact from a submission csv and make it current
+Parameters: submission csv path, model name, registry directory, Dataset giving each county's state and name
+Returns: artifact directory
+'''
+def publish(submission_path, model, root=FORECAST_DIR, data=None):
+    if data is None:
+        data = datastore.get_dataset()
+    cfips, months, forecast = read_submission(submission_path)
+
+    # Counties are named as in the dashboard's dropdowns; unknown counties are left out
+    places = data.df.drop_duplicates('cfips').assign(code=lambda df: df['cfips'].astype('int64')).set_index('code')
+    known = np.isin(cfips, places.index.to_numpy())
+    cfips, forecast = cfips[known], forecast[known]
+    state_names = places.loc[cfips, 'state'].astype(str).to_numpy()
+    states, state_codes = np.unique(state_names, return_inverse=True)
+
+    # State and national series are mean densities, as in the dashboard's history plots, over the counties
+    # the submission has a value for (NaN where none has)
+    observed = ~np.isnan(forecast)
+    values = np.where(observed, forecast, 0.0)
+    state_sums = np.stack([np.bincount(state_codes, weights=values[:, i], minlength=len(states)) for i in range(len(months))], axis=1)
+    state_counts = np.stack([np.bincount(state_codes, weights=observed[:, i], minlength=len(states)) for i in range(len(months))], axis=1)
+    state_forecast = np.divide(state_sums, state_counts, out=np.full(state_sums.shape, np.nan), where=state_counts > 0)
+    national_counts = observed.sum(axis=0)
+    national_forecast = np.divide(values.sum(axis=0), national_counts, out=np.full(len(months), np.nan), where=national_counts > 0)
+
+    artifact_id = '{}-{}-{}'.format(model, time.strftime('%Y%m%d%H%M%S'), hashlib.sha1(forecast.tobytes()).hexdigest()[:8])
+    path = os.path.join(root, artifact_id)
+    tmp_path = path + '.tmp'
+    os.makedirs(tmp_path)
+    arrays = {'cfips': cfips.astype('int32'), 'state_codes': state_codes.astype('int32'), 'forecast': forecast,
+              'state_forecast': state_forecast, 'national_forecast': national_forecast}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+    metadata = {'format_version': FORMAT_VERSION, 'artifact_id': artifact_id, 'model': model,
+                'created': time.time(), 'source': os.path.abspath(submission_path), 'data_fingerprint': data.fingerprint,
+                'months': months, 'states': states.tolist(),
+                'counties': places.loc[cfips, 'county'].astype(str).tolist()}
+    with open(os.path.join(tmp_path, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, path)
+
+    # Flip the pointer last so the app never sees a half written artifact
+    pointer_path = os.path.join(root, 'CURRENT')
+    with open(pointer_path + '.tmp', 'w') as f:
+        f.write(artifact_id)
+    os.replace(pointer_path + '.tmp', pointer_path)
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish a submission csv as the forecast served by the dashboard')
+    parser.add_argument('submission')
+    parser.add_argument('--model', required=True, help='model name shown with the forecast, e.g. lgbm')
+    parser.add_argument('--root', default=FORECAST_DIR)
+    args = parser.parse_args()
+    print(publish(args.submission, args.model, args.root))
@@ -0,0 +1,259 @@
+'''
+Import libraries
+'''
+import json
+import eda
+import geo
+import aggregates
+
+'''
+Values of the statistics type dropdown
+'''
+STATS_TYPES = ['Pct broadband', 'Pct college degree', 'Pct IT workforce', 'Median household income']
+
+'''
+Function: Serialize a figure as an html fragment
+Parameters: plotly figure
+Returns: html string (plotly.js itself is loaded once by the page)
+'''
+def fig_to_html(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False)
+
+'''
+Function: Serialize a figure as compact plotly json
+Parameters: plotly figure
+Returns: json string where choropleth geometry is replaced by the url it is served from
+'''
+def fig_to_json(fig):
+    for trace in fig.data:
+        geojson = getattr(trace, 'geojson', None)
+        if isinstance(geojson, dict):
+            trace.geojson = geo.get_geojson_url(geojson.get('name', 'counties'))
+    return fig.to_json()
+
+'''
+Function: Serialize a figure in the requested response format
+Parameters: plotly figure, 'html' or 'json'
+Returns: html fragment or json string
+'''
+def render_figure(fig, fmt='html'):
+    if fmt == 'json':
+        return fig_to_json(fig)
+    return fig_to_html(fig)
+
+'''
+Function: Create the html options for a dropdown
+Parameters: list of values
+Returns: html string
+'''
+def get_options_html(values):
+    html_string_selected = ''
+    for entry in values:
+        html_string_selected += '<option value="{}">{}</option>'.format(entry, entry)
+    return html_string_selected
+
+'''
+Function: Render dropdown options in the requested response format
+Parameters: list of values, 'html' or 'json'
+Returns: html string, json encoded in json mode
+'''
+def render_options(values, fmt='html'):
+    if fmt == 'json':
+        return json.dumps(get_options_html(values))
+    return get_options_html(values)
+
+'''
+Function: Get the county dropdown options of a state, rendered once per dataset for every state
+Parameters: Dataset, selected state, 'html' or 'json'
+Returns: option html string, json encoded in json mode
+'''
+def get_county_options(data, state, fmt='html'):
+    options = data.memo('county_options_' + fmt, lambda: {
+        state: render_options(counties, fmt) for state, counties in data.places['counties'].items()})
+    return options.get(state) or render_options(['All counties'], fmt)
+
+'''
+Figures of the landing page: each one is independent, so they can be built concurrently
+'''
+INDEX_FIGURES = {
+    # Get plot for 'Change in number of microbusinesses' part of the dashboard
+    'default_plot': lambda data: eda.get_default_mbd_plot(data.cube),
+    # Plot 2 - MBD Choropeth map
+    'density_plot': lambda data: eda.get_mbd_choropleth(data.df),
+    'broadband_plot': lambda data: eda.get_pct_broadband_plot(data.master_by_state['All States']),
+    'college_plot': lambda data: eda.get_pct_college_plot(data.master_by_state['All States']),
+    'workforce_plot': lambda data: eda.get_pct_workforce_plot(data.master_by_state['All States']),
+    'hh_income_plot': lambda data: eda.get_hh_median_income_plot(data.master_by_state['All States']),
+    'broadband_line_plot': lambda data: eda.get_statistics_line_plots(data.census_stats),
+}
+
+'''
+Function: Build one figure of the landing page
+Parameters: Dataset, figure name from INDEX_FIGURES
+Returns: dictionary of html fragments
+'''
+def build_index_figure(data, figure, fmt='html'):
+    return {figure: render_figure(INDEX_FIGURES[figure](data), fmt)}
+
+'''
+Function: Build the figures of the landing page
+Parameters: Dataset
+Returns: dictionary of html fragments
+'''
+def build_index(data, fmt='html'):
+    fragments_dict = {}
+    for figure in INDEX_FIGURES:
+        fragments_dict.update(build_index_figure(data, figure, fmt))
+    return fragments_dict
+
+'''
+Function: Build the county dropdown and state line plot for MBD line plot
+Parameters: Dataset, selected state
+Returns: dictionary of html fragments
+'''
+def build_county_dropdown(data, state, fmt='html'):
+    fig, _ = eda.get_updated_county_list(state, data.cube, data.places)
+    return dict(html_string_selected = get_county_options(data, state, fmt), state_plot = render_figure(fig, fmt))
+
+'''
+Function: Build the MBD line plot for a state or county
+Parameters: Dataset, selected state, selected county
+Returns: dictionary of html fragments
+'''
+def build_plot(data, state, county, fmt='html'):
+    fig = eda.get_updated_mbd_line_plot(state, county, data.cube)
+    return dict(county_plot = render_figure(fig, fmt))
+
+'''
+Function: Build the MBD choropleth for a state and month
+Parameters: Dataset, selected state, selected month
+Returns: dictionary of html fragments
+'''
+def build_density_plot(data, state, month, fmt='html'):
+    fig = eda.get_updated_mbd_choropleth(state, month, data.df, data.census_df)
+    return dict(density_plot = render_figure(fig, fmt))
+
+'''
+Function: Build the four census choropleths for a state and year
+Parameters: Dataset, selected state, selected year
+Returns: dictionary of html fragments
+'''
+def build_metrics_plots(data, state, year, fmt='html'):
+    broadband_plot, college_plot, workforce_plot, hh_income_plot = eda.get_updated_metrics_choropleths(state, year, data.master_by_state)
+    return dict(broadband_plot = render_figure(broadband_plot, fmt),
+    college_plot = render_figure(college_plot, fmt),
+    workforce_plot = render_figure(workforce_plot, fmt),
+    income_plot = render_figure(hh_income_plot, fmt))
+
+'''
+Function: Build the stats county dropdown and state line plot
+Parameters: Dataset, selected state, selected stats type
+Returns: dictionary of html fragments
+'''
+def build_stats_county_dropdown(data, state, stats_type, fmt='html'):
+    fig, _ = eda.get_updated_stats_county_list(state, stats_type, data.census_stats, data.places)
+    return dict(html_string_selected = get_county_options(data, state, fmt), plot = render_figure(fig, fmt))
+
+'''
+Function: Build the stats line plot for a state or county
+Parameters: Dataset, selected state, selected county, selected stats type
+Returns: dictionary of html fragments
+'''
+def build_stats_plot(data, state, county, stats_type, fmt='html'):
+    fig = eda.get_updated_stats_line_plot(state, county, stats_type, data.census_stats)
+    return dict(plot = render_figure(fig, fmt))
+
+'''
+Fragment builders by route, with the dropdown parameters each one takes
+'''
+BUILDERS = {
+    'index': (build_index, ()),
+    'index_figure': (build_index_figure, ('figure',)),
+    'update_county_dropdown': (build_county_dropdown, ('state',)),
+    'update_plot': (build_plot, ('state', 'county')),
+    'update_density_plot': (build_density_plot, ('state', 'month')),
+    'update_metrics_plots': (build_metrics_plots, ('state', 'year')),
+    'update_stats_county_dropdown': (build_stats_county_dropdown, ('state', 'stats_type')),
+    'update_stats_plot': (build_stats_plot, ('state', 'county', 'stats_type')),
+}
+
+'''
+What the fragments of each route read: 'series' every month of the mbd data, 'month' only the month
+parameter's rows, 'census' the county master and census tables
+'''
+DEPENDENCIES = {
+    'index': 'series',
+    'index_figure': 'series',
+    'update_county_dropdown': 'series',
+    'update_plot': 'series',
+    'update_density_plot': 'month',
+    'update_metrics_plots': 'census',
+    'update_stats_county_dropdown': 'census',
+    'update_stats_plot': 'census',
+}
+
+'''
+Function: Check whether an incremental refresh changed the fragments of a view
+Parameters: route name, dropdown parameters, changes of the refreshed Dataset
+Returns: True if the view must be rendered again
+'''
+def is_affected(route, params, changes):
+    dependency = DEPENDENCIES.get(route, 'series')
+    if dependency == 'month':
+        return params.get('month') in changes['months'] or changes['new_counties']
+    if dependency == 'census':
+        return changes['new_counties']
+    return True
+
+'''
+Dashboard panels served by the batched endpoint: the route each one shares its fragments with,
+and which dashboard state value feeds each of the route's parameters
+'''
+PANELS = {
+    'county_dropdown': ('update_county_dropdown', {'state': 'state'}),
+    'plot': ('update_plot', {'state': 'state', 'county': 'county'}),
+    'density_plot': ('update_density_plot', {'state': 'density_state', 'month': 'month'}),
+    'metrics_plots': ('update_metrics_plots', {'state': 'metrics_state', 'year': 'year'}),
+    'stats_county_dropdown': ('update_stats_county_dropdown', {'state': 'stats_state', 'stats_type': 'stats_type'}),
+    'stats_plot': ('update_stats_plot', {'state': 'stats_state', 'county': 'stats_county', 'stats_type': 'stats_type'}),
+}
+
+'''
+Function: Get the route and parameters of a dashboard panel
+Parameters: panel name, dictionary of dashboard state
+Returns: route name, dictionary of route parameters
+'''
+def get_panel_route(panel, dashboard_state):
+    route, sources = PANELS[panel]
+    return route, {name: dashboard_state.get(source) for name, source in sources.items()}
+
+'''
+Function: Build the fragments of a route
+Parameters: Dataset, route name, 'html' or 'json', dropdown parameters
+Returns: dictionary of fragments
+'''
+def build_fragments(data, route, fmt='html', **params):
+    build, names = BUILDERS[route]
+    return build(data, *[params[name] for name in names], fmt=fmt)
+
+'''
+Function: Enumerate every valid dropdown combination of the prerendered routes
+Parameters: Dataset
+Returns: list of (route, params) tuples
+'''
+def enumerate_views(data):
+    states = [state for state in data.master_by_state if state != 'All States']
+    months, years = eda.get_years_months_lists(data.months)
+
+    views = []
+    for state in ['All States'] + states:
+        for month in months:
+            views.append(('update_density_plot', dict(state=state, month=month)))
+        for year in years:
+            views.append(('update_metrics_plots', dict(state=state, year=year)))
+    for state in states:
+        for county in aggregates.get_state_counties(data.places, state):
+            views.append(('update_plot', dict(state=state, county=county)))
+            for stats_type in STATS_TYPES:
+                views.append(('update_stats_plot', dict(state=state, county=county, stats_type=stats_type)))
+    return views
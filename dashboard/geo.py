@@ -0,0 +1,148 @@
+'''
+Import libraries
+'''
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from urllib.request import urlopen
+from datastore import DATA_DIR
+
+'''
+Bundled county geometry. The gzipped file is preferred; the plain json is accepted too.
+'''
+GEOJSON_URL = 'https://raw.githubusercontent.com/plotly/datasets/master/geojson-counties-fips.json'
+GEOJSON_FILE = 'geojson-counties-fips.json'
+
+_lock = threading.Lock()
+_index = None
+
+'''
+Class: County GeoJSON loaded once with features indexed by fips and by state fips prefix
+Attributes: full feature collection, fips->feature dict, state->feature collection dict
+'''
+class CountyGeometry:
+    def __init__(self, counties_geojson):
+        # Collections carry a 'name' member so figures can refer to them by url
+        self.geojson = counties_geojson
+        self.geojson['name'] = 'counties'
+        self.by_fips = {}
+        by_state = {}
+        for feature in counties_geojson['features']:
+            self.by_fips[feature['id']] = feature
+            by_state.setdefault(feature['id'][:2], []).append(feature)
+        # Per-state collections reference the same feature dicts as the national one
+        self.by_state = {state: {'type': 'FeatureCollection', 'name': state, 'features': features}
+                         for state, features in by_state.items()}
+        self.payloads = {}
+        self.payloads_lock = threading.Lock()
+
+    '''
+    Function: Get a collection by name
+    Parameters: 'counties' or a two digit state fips
+    Returns: feature collection or None
+    '''
+    def get_collection(self, name):
+        if name == 'counties':
+            return self.geojson
+        return self.by_state.get(name)
+
+    '''
+    Function: Get the serialized payload of a collection, encoded once and kept
+    Parameters: 'counties' or a two digit state fips
+    Returns: (json bytes, gzipped json bytes, etag) or None
+    '''
+    def get_payload(self, name):
+        payload = self.payloads.get(name)
+        if payload is None:
+            collection = self.get_collection(name)
+            if collection is None:
+                return None
+            body = json.dumps(collection, separators=(',', ':')).encode('utf-8')
+            payload = (body, gzip.compress(body, 9), hashlib.sha1(body).hexdigest())
+            with self.payloads_lock:
+                self.payloads[name] = payload
+        return payload
+
+'''
+Function: Find the bundled geojson file on disk
+Parameters: data directory
+Returns: path of the geojson file or None
+'''
+def find_geojson_file(data_dir=DATA_DIR):
+    for name in (GEOJSON_FILE + '.gz', GEOJSON_FILE):
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+'''
+Function: Read the county geojson from disk
+Parameters: data directory
+Returns: dictionary for counties geoJSON
+'''
+def read_counties_geojson(data_dir=DATA_DIR):
+    path = find_geojson_file(data_dir)
+    if path is None:
+        raise FileNotFoundError('County geojson not found in {}; run "python geo.py" once to fetch it'.format(data_dir))
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+'''
+Function: Get the shared county geometry index, loading it on first use
+Parameters: None
+Returns: CountyGeometry
+'''
+def get_county_geometry():
+    global _index
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                _index = CountyGeometry(read_counties_geojson())
+            index = _index
+    return index
+
+'''
+Function: Get the full county geojson
+Parameters: None
+Returns: dictionary for counties geoJSON
+'''
+def get_counties_geojson():
+    return get_county_geometry().geojson
+
+'''
+Function: Get the counties of one state as a feature collection
+Parameters: two digit state fips
+Returns: dictionary for the state's counties geoJSON
+'''
+def get_state_geojson(state_fips):
+    return get_county_geometry().by_state.get(state_fips, {'type': 'FeatureCollection', 'features': []})
+
+'''
+Function: Get the url the dashboard serves a collection from
+Parameters: 'counties' or a two digit state fips
+Returns: url path
+'''
+def get_geojson_url(name):
+    return '/geojson/{}.json'.format(name)
+
+'''
+Function: Download the county geojson into the data directory (run once, offline afterwards)
+Parameters: data directory
+Returns: path of the written file
+'''
+def fetch_counties_geojson(data_dir=DATA_DIR):
+    path = os.path.join(data_dir, GEOJSON_FILE + '.gz')
+    with urlopen(GEOJSON_URL) as response:
+        payload = response.read()
+    json.loads(payload)
+    with gzip.open(path, 'wb') as f:
+        f.write(payload)
+    return path
+
+if __name__ == '__main__':
+    print(fetch_counties_geojson(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR))
@@ -0,0 +1,45 @@
+'''
+Gunicorn settings for the dashboard; every value can be overridden from the environment.
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:application   (from the dashboard directory)
+'''
+
+'''
+Import libraries
+'''
+import logging
+import multiprocessing
+import os
+
+bind = os.environ.get('MBD_BIND', '0.0.0.0:8000')
+
+# One worker process per core; threads in each worker serve cached and prerendered responses
+workers = int(os.environ.get('MBD_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('MBD_THREADS', 4))
+
+# Import the app in the master; with MBD_WARMUP=preload the data is loaded there too, so the
+# forked workers share it copy-on-write
+preload_app = True
+timeout = int(os.environ.get('MBD_TIMEOUT', 120))
+
+# The dashboard's own log records (e.g. data refreshes) go to stderr like gunicorn's error log
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s: %(message)s')
+
+'''
+Function: Fork the worker's render processes while the worker is still single threaded, then
+start the worker's own warm-up when the master did not preload, and its data watcher
+Parameters: gunicorn arbiter, worker
+Returns: None
+'''
+def post_fork(server, worker):
+    import render_pool
+    import refresh
+    import startup
+    render_pool.render_pool.start()
+    if startup.WARMUP == 'background':
+        import app
+        app.warm_up(background=True)
+
+    # Each worker holds its own snapshot, so each one watches for appended rows and the refresh trigger
+    refresh.watcher.start()
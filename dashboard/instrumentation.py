@@ -0,0 +1,280 @@
+'''
+Import libraries
+'''
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request
+
+'''
+Histogram bucket upper bounds: milliseconds for timings, bytes for payloads
+'''
+TIME_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf')]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, float('inf')]
+
+'''
+Requests slower than this many milliseconds are profiled and written to MBD_PROFILE_DIR; unset disables profiling
+'''
+PROFILE_SLOW_MS = os.environ.get('MBD_PROFILE_SLOW_MS')
+PROFILE_DIR = os.environ.get('MBD_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_INTERVAL = float(os.environ.get('MBD_PROFILE_INTERVAL_MS', 5)) / 1000
+
+'''
+Class: Cumulative histogram of observed values
+Attributes: bucket upper bounds, per-bucket counts, count, sum, max
+'''
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    '''
+    Function: Record one value
+    Parameters: value
+    Returns: None
+    '''
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    '''
+    Function: Estimate a quantile as the upper bound of the bucket it falls in
+    Parameters: quantile between 0 and 1
+    Returns: bucket bound (the max for the last bucket), or None when empty
+    '''
+    def quantile(self, q):
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound if bound != float('inf') else self.max
+        return self.max
+
+    '''
+    Function: Summarize the histogram
+    Parameters: None
+    Returns: dictionary of count, sum, mean, max, p50, p95, p99 and bucket counts
+    '''
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+'''
+Class: Named histograms of route timings, stage timings and response payload sizes
+Attributes: histograms by kind and name, lock
+'''
+class Metrics:
+    def __init__(self):
+        self.histograms = {'route_ms': {}, 'stage_ms': {}, 'payload_bytes': {}}
+        self.lock = threading.Lock()
+
+    '''
+    Function: Record a value in a named histogram
+    Parameters: histogram kind, name, value
+    Returns: None
+    '''
+    def observe(self, kind, name, value):
+        with self.lock:
+            histogram = self.histograms[kind].get(name)
+            if histogram is None:
+                histogram = self.histograms[kind][name] = Histogram(SIZE_BUCKETS if kind == 'payload_bytes' else TIME_BUCKETS_MS)
+            histogram.observe(value)
+
+    '''
+    Function: Summarize every histogram
+    Parameters: None
+    Returns: dictionary of kind -> name -> summary
+    '''
+    def to_dict(self):
+        with self.lock:
+            return {kind: {name: histogram.to_dict() for name, histogram in sorted(histograms.items())}
+                    for kind, histograms in self.histograms.items()}
+
+    '''
+    Function: Drop every recorded value
+    Parameters: None
+    Returns: None
+    '''
+    def clear(self):
+        with self.lock:
+            for histograms in self.histograms.values():
+                histograms.clear()
+
+metrics = Metrics()
+
+'''
+Function: Time a block of code as a named stage, also adding it to the current request's breakdown
+Parameters: stage name
+Returns: context manager
+'''
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe('stage_ms', name, elapsed_ms)
+        try:
+            g.mbd_stages.append((name, elapsed_ms))
+        except (AttributeError, RuntimeError):
+            # Outside a request, e.g. while preloading
+            pass
+
+'''
+Function: Wrap a function so every call is timed as a stage
+Parameters: function, stage name
+Returns: wrapped function
+'''
+def timed(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return function(*args, **kwargs)
+    wrapper.mbd_timed = True
+    return wrapper
+
+'''
+Function: Time the named functions of a module as stages by replacing the module attributes
+Parameters: module, list of function names (None for every public function defined in it), stage name prefix
+Returns: None
+'''
+def instrument_module(module, names=None, prefix=None):
+    prefix = prefix or module.__name__
+    if names is None:
+        names = [name for name, value in vars(module).items()
+                 if callable(value) and not name.startswith('_') and getattr(value, '__module__', None) == module.__name__
+                 and not isinstance(value, type)]
+    for name in names:
+        function = getattr(module, name)
+        if not getattr(function, 'mbd_timed', False):
+            setattr(module, name, timed(function, '{}.{}'.format(prefix, name)))
+
+'''
+Class: Sampling profiler for one thread: a background thread records the thread's stack at a fixed interval
+Attributes: target thread id, sampling interval, collapsed stack counts
+'''
+class Sampler:
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    '''
+    Function: Sample the target thread until stopped
+    Parameters: None
+    Returns: None
+    '''
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append('{}:{}'.format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    '''
+    Function: Write the samples in collapsed stack format (one "frame;frame;frame count" line per stack)
+    Parameters: output path
+    Returns: None
+    '''
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+'''
+Function: Start timing a request
+Parameters: None
+Returns: None
+'''
+def before_request():
+    g.mbd_start = time.perf_counter()
+    g.mbd_stages = []
+    g.mbd_sampler = None
+    if PROFILE_SLOW_MS is not None:
+        g.mbd_sampler = Sampler(threading.get_ident())
+        g.mbd_sampler.start()
+
+'''
+Function: Record the route timing and payload size and attach the stage breakdown as a Server-Timing header
+Parameters: flask response
+Returns: flask response
+'''
+def after_request(response):
+    start = getattr(g, 'mbd_start', None)
+    if start is None:
+        return response
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    route = request.endpoint or 'unknown'
+    metrics.observe('route_ms', route, elapsed_ms)
+    if not response.direct_passthrough:
+        metrics.observe('payload_bytes', route, len(response.get_data()))
+
+    # Browsers show Server-Timing in the network panel; repeated stages are summed
+    totals = {}
+    for name, stage_ms in g.mbd_stages:
+        totals[name] = totals.get(name, 0.0) + stage_ms
+    timings = ['{};dur={:.1f}'.format(name.replace('.', '_'), stage_ms) for name, stage_ms in totals.items()]
+    response.headers['Server-Timing'] = ', '.join(timings + ['total;dur={:.1f}'.format(elapsed_ms)])
+
+    sampler = g.mbd_sampler
+    if sampler is not None:
+        sampler.stop()
+        if elapsed_ms >= float(PROFILE_SLOW_MS):
+            sampler.write(os.path.join(PROFILE_DIR, '{}-{}-{:.0f}ms.txt'.format(time.strftime('%Y%m%d%H%M%S'), route, elapsed_ms)))
+    return response
+
+'''
+Function: Stop the profiler of a request that failed before after_request ran
+Parameters: exception or None
+Returns: None
+'''
+def teardown_request(exception):
+    sampler = g.get('mbd_sampler')
+    if sampler is not None and not sampler.stopped.is_set():
+        sampler.stop()
+
+'''
+Function: Register the request hooks on a Flask app
+Parameters: flask app
+Returns: None
+'''
+def init_app(app):
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
@@ -0,0 +1,50 @@
+'''
+Import libraries
+'''
+import importlib
+import threading
+import time
+
+'''
+Milliseconds spent importing each lazily imported module, recorded on first use
+'''
+import_timings = {}
+
+'''
+Class: Stand-in for a module that is imported on first attribute access
+Attributes: module name, function called with the module once it is imported, the imported module
+'''
+class LazyModule:
+    def __init__(self, name, on_import=None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+        self._lock = threading.Lock()
+
+    '''
+    Function: Import the module if it has not been imported yet
+    Parameters: None
+    Returns: the module
+    '''
+    def load_module(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_import is not None:
+                        self._on_import(module)
+                    import_timings[self._name] = (time.perf_counter() - start) * 1000
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load_module(), attribute)
+
+'''
+Function: Defer importing a module until it is first used
+Parameters: module name, optional function called with the module once it is imported
+Returns: LazyModule
+'''
+def lazy_import(name, on_import=None):
+    return LazyModule(name, on_import)
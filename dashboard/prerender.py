@@ -0,0 +1,173 @@
+'''
+Prerender every dashboard view to disk.
+
+Usage: python prerender.py [--out DIR] [--workers N] [--chunk-size N] [--formats html,json]
+
+Fragments are written gzip-compressed to DIR/objects/<sha256 prefix>/<sha256>.json.gz
+and DIR/manifest.json maps each (route, params) key to its digest. The Flask app
+serves a fragment from the manifest when it was built from the same data files.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import datastore
+import fragments
+
+PRERENDER_DIR = os.environ.get('MBD_PRERENDER_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prerendered'))
+
+'''
+Function: Build the canonical string key of a view
+Parameters: route name, dropdown parameters
+Returns: key string
+'''
+def get_view_key(route, params):
+    return json.dumps([route, sorted(params.items())], separators=(',', ':'))
+
+'''
+Function: Get the path of a content-addressed object
+Parameters: output directory, sha256 hex digest
+Returns: file path
+'''
+def get_object_path(out_dir, digest):
+    return os.path.join(out_dir, 'objects', digest[:2], digest + '.json.gz')
+
+'''
+Function: Render a chunk of views and write each one to the object store
+Parameters: output directory, list of (route, params)
+Returns: list of (key, digest)
+'''
+def render_chunk(out_dir, views):
+    data = datastore.get_dataset()
+    written = []
+    for route, params in views:
+        payload = json.dumps(fragments.build_fragments(data, route, **params)).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        path = get_object_path(out_dir, digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        written.append((get_view_key(route, params), digest))
+    return written
+
+'''
+Function: Render every view in parallel and write the manifest
+Parameters: output directory, number of worker processes, views per task, response formats
+Returns: manifest dictionary
+'''
+def prerender(out_dir=PRERENDER_DIR, workers=None, chunk_size=50, formats=('html', 'json')):
+    # Load once in the parent so forked workers share the dataset
+    data = datastore.get_dataset()
+    views = [(route, dict(params, fmt=fmt)) for fmt in formats for route, params in fragments.enumerate_views(data)]
+    chunks = [views[i:i + chunk_size] for i in range(0, len(views), chunk_size)]
+
+    entries = {}
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for written in pool.map(render_chunk, [out_dir] * len(chunks), chunks):
+            entries.update(written)
+            print('Rendered {}/{} views ({:.1f}s)'.format(len(entries), len(views), time.time() - start))
+
+    manifest = {'fingerprint': data.fingerprint, 'created': time.time(), 'entries': entries}
+    tmp_path = os.path.join(out_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(out_dir, 'manifest.json'))
+    return manifest
+
+'''
+Class: Read side of the prerendered fragment store used by the Flask app
+Attributes: store directory, manifest entries by data fingerprint (the current snapshot's and the one before it)
+'''
+class PrerenderedStore:
+    def __init__(self, out_dir=PRERENDER_DIR, max_fingerprints=2):
+        self.out_dir = out_dir
+        self.max_fingerprints = max_fingerprints
+        self.manifests = OrderedDict()
+        self.lock = threading.Lock()
+
+    '''
+    Function: Keep the manifest entries of a fingerprint, dropping the oldest fingerprint past the limit
+    Parameters: data fingerprint, dictionary of view key -> object digest
+    Returns: None
+    '''
+    def add(self, fingerprint, entries):
+        with self.lock:
+            self.manifests[fingerprint] = entries
+            self.manifests.move_to_end(fingerprint)
+            while len(self.manifests) > self.max_fingerprints:
+                self.manifests.popitem(last=False)
+
+    '''
+    Function: (Re)load the manifest for a fingerprint; it has no entries unless it matches the data files
+    Parameters: data fingerprint
+    Returns: dictionary of view key -> object digest
+    '''
+    def load(self, fingerprint):
+        entries = {}
+        path = os.path.join(self.out_dir, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get('fingerprint') == fingerprint:
+                entries = manifest['entries']
+        self.add(fingerprint, entries)
+        return entries
+
+    '''
+    Function: Follow an incremental refresh of the data, keeping the entries of views it did not change
+    Parameters: fingerprint the entries were built for, new data fingerprint, function of (route, params) that is True to keep an entry
+    Returns: None
+    '''
+    def carry_over(self, fingerprint, new_fingerprint, keep):
+        with self.lock:
+            previous = self.manifests.get(fingerprint)
+        if previous is None:
+            return
+        entries = {}
+        for key, digest in previous.items():
+            route, params = json.loads(key)
+            if keep(route, dict(params)):
+                entries[key] = digest
+        # The previous fingerprint's entries stay for requests still holding the previous snapshot
+        self.add(new_fingerprint, entries)
+
+    '''
+    Function: Get the prerendered fragments of a view
+    Parameters: data fingerprint, route name, dropdown parameters
+    Returns: dictionary of fragments or None
+    '''
+    def get(self, fingerprint, route, params):
+        with self.lock:
+            entries = self.manifests.get(fingerprint)
+        if entries is None:
+            entries = self.load(fingerprint)
+        digest = entries.get(get_view_key(route, params))
+        if digest is None:
+            return None
+        try:
+            with gzip.open(get_object_path(self.out_dir, digest), 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prerender every dashboard view to disk')
+    parser.add_argument('--out', default=PRERENDER_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--formats', default='html,json')
+    args = parser.parse_args()
+    prerender(args.out, args.workers, args.chunk_size, args.formats.split(','))
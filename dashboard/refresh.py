@@ -0,0 +1,151 @@
+'''
+Import libraries
+'''
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+import datastore
+
+logger = logging.getLogger(__name__)
+
+'''
+Seconds between checks of train.csv for appended rows (0 disables polling), and the bearer token
+of POST /admin/refresh (unset disables the endpoint)
+'''
+REFRESH_INTERVAL = float(os.environ.get('MBD_REFRESH_INTERVAL', 0))
+ADMIN_TOKEN = os.environ.get('MBD_ADMIN_TOKEN')
+
+'''
+File touched by POST /admin/refresh so every worker process serving the same data directory refreshes,
+and the seconds between checks of it
+'''
+REFRESH_TRIGGER = os.environ.get('MBD_REFRESH_TRIGGER', os.path.join(
+    tempfile.gettempdir(), 'mbd-refresh-' + hashlib.sha1(os.path.abspath(datastore.DATA_DIR).encode()).hexdigest()[:12]))
+TRIGGER_CHECK_INTERVAL = 1.0
+
+'''
+Function: Refresh the data, log and summarize what changed
+Parameters: None
+Returns: dictionary of whether anything was added, the current version, rows, months and the refresh time
+'''
+def run_refresh():
+    start = time.perf_counter()
+    refreshed = datastore.refresh_dataset()
+    data = datastore.get_dataset()
+    seconds = time.perf_counter() - start
+    if refreshed is not None and refreshed.changes is not None:
+        logger.info('Refreshed data to version %s (%s rows added, months %s) in %.2fs', refreshed.version,
+                    refreshed.changes['rows'], ', '.join(refreshed.changes['months']), seconds)
+    elif refreshed is not None:
+        logger.info('Reloaded data as version %s in %.2fs', refreshed.version, seconds)
+    return {'refreshed': refreshed is not None, 'version': data.version, 'rows': len(data.df),
+            'last_month': data.months[-1] if data.months else None,
+            'changes': data.changes if refreshed is not None else None,
+            'seconds': seconds}
+
+'''
+Function: Get the modification time of the refresh trigger file
+Parameters: trigger file path
+Returns: modification time in nanoseconds, or None if the file does not exist
+'''
+def get_trigger_mtime(path=REFRESH_TRIGGER):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+'''
+Function: Ask every worker process to refresh by touching the trigger file their watchers check
+Parameters: trigger file path
+Returns: None
+'''
+def trigger_refresh(path=REFRESH_TRIGGER):
+    with open(path, 'a'):
+        os.utime(path)
+
+'''
+Class: Background thread that refreshes the data when rows are appended to train.csv or the trigger file is touched
+Attributes: polling interval, trigger file path (None when nothing touches it) and its last seen modification time,
+stop event, thread, last summary and error
+'''
+class DataWatcher:
+    def __init__(self, interval=REFRESH_INTERVAL, trigger_path=REFRESH_TRIGGER if ADMIN_TOKEN is not None else None):
+        self.interval = interval
+        self.trigger_path = trigger_path
+        self.trigger_mtime = None
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    '''
+    Function: Start watching, once per process; threads do not survive a fork, so call this in the serving process
+    Parameters: None
+    Returns: None
+    '''
+    def start(self):
+        with self.lock:
+            if (self.interval > 0 or self.trigger_path is not None) and self.thread is None:
+                if self.trigger_path is not None:
+                    self.trigger_mtime = get_trigger_mtime(self.trigger_path)
+                self.thread = threading.Thread(target=self.run, name='data-watcher', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    '''
+    Function: Check whether the trigger file was touched since the last check
+    Parameters: None
+    Returns: True if it was
+    '''
+    def is_triggered(self):
+        if self.trigger_path is None:
+            return False
+        mtime = get_trigger_mtime(self.trigger_path)
+        if mtime == self.trigger_mtime:
+            return False
+        self.trigger_mtime = mtime
+        return True
+
+    '''
+    Function: Refresh when triggered or when the polling interval has passed, until stopped; a failed refresh
+    is logged and retried at the next check
+    Parameters: None
+    Returns: None
+    '''
+    def run(self):
+        # The trigger file is cheap to check, so it is checked every second and train.csv every interval
+        wait = self.interval if self.trigger_path is None else min(TRIGGER_CHECK_INTERVAL, self.interval or TRIGGER_CHECK_INTERVAL)
+        polled = time.monotonic()
+        while not self.stopped.wait(wait):
+            due = self.interval > 0 and time.monotonic() - polled >= self.interval
+            if not (self.is_triggered() or due):
+                continue
+            polled = time.monotonic()
+            try:
+                summary = run_refresh()
+                self.error = None
+                if summary['refreshed']:
+                    self.last = summary
+            except Exception:
+                self.error = traceback.format_exc()
+                logger.exception('Refreshing the data failed')
+
+watcher = DataWatcher()
+
+'''
+Function: Check the bearer token of an admin request
+Parameters: flask request
+Returns: True if admin requests are enabled and the token matches
+'''
+def is_authorized(request):
+    if ADMIN_TOKEN is None:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + ADMIN_TOKEN)
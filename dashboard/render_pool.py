@@ -0,0 +1,114 @@
+'''
+Import libraries
+'''
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import datastore
+import fragments
+
+'''
+Number of render processes per server worker (0 renders in the request thread) and
+how many renders may be queued or running at once before request threads wait
+'''
+RENDER_PROCESSES = int(os.environ.get('MBD_RENDER_PROCESSES', 0))
+RENDER_MAX_PENDING = int(os.environ.get('MBD_RENDER_MAX_PENDING', 2 * max(RENDER_PROCESSES, 1)))
+
+'''
+Start method of render processes created once the server process may be running threads: forking
+then could copy a lock some other thread holds, so they start clean and load the data themselves
+'''
+RESTART_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+'''
+Function: Load the dataset in a new render process; a forked one already holds it
+Parameters: data directory of the server process
+Returns: None
+'''
+def init_render_process(data_dir):
+    datastore.get_dataset(data_dir)
+
+'''
+Function: Build fragments in a render process from its own dataset
+Parameters: fingerprint of the dataset the request was served from, route name, dropdown parameters
+Returns: dictionary of fragments, or None if this process holds data from different source files
+'''
+def render_fragments(fingerprint, route, params):
+    data = datastore.get_dataset()
+    if data.fingerprint != fingerprint:
+        return None
+    return fragments.build_fragments(data, route, **params)
+
+'''
+Class: Bounded pool of render processes for CPU-heavy figure building
+Attributes: number of processes, pending render slots, executor, the pid that created it and
+a future that is done once its processes are up and have loaded the data
+'''
+class RenderPool:
+    def __init__(self, processes=RENDER_PROCESSES, max_pending=RENDER_MAX_PENDING):
+        self.processes = processes
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.pid = None
+        self.ready = None
+        self.lock = threading.Lock()
+
+    '''
+    Function: Get the executor of this process, creating it on first use
+    Parameters: start method of new render processes
+    Returns: ProcessPoolExecutor
+    '''
+    def get_executor(self, method=RESTART_METHOD):
+        with self.lock:
+            # An executor inherited from a parent process cannot be used after fork
+            if self.executor is None or self.pid != os.getpid():
+                context = multiprocessing.get_context(method)
+                if method == 'forkserver':
+                    context.set_forkserver_preload(['render_pool'])
+                self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                                    initializer=init_render_process, initargs=(datastore.DATA_DIR,))
+                self.pid = os.getpid()
+                self.ready = self.executor.submit(os.getpid)
+            return self.executor
+
+    '''
+    Function: Fork the render processes now, right after a server worker starts and before it runs threads;
+    the only place they are forked
+    Parameters: None
+    Returns: None
+    '''
+    def start(self):
+        if self.processes:
+            # Forking processes are all started on the first submit
+            self.get_executor('fork')
+            self.ready.result()
+
+    '''
+    Function: Build the fragments of a route, in a render process when the pool is enabled and up
+    Parameters: Dataset, route name, dropdown parameters
+    Returns: dictionary of fragments
+    '''
+    def build(self, data, route, params):
+        if self.processes:
+            executor = self.get_executor()
+            # Until new processes have loaded the data, requests render in their own thread
+            if self.ready.done():
+                with self.slots:
+                    result = executor.submit(render_fragments, data.fingerprint, route, params).result()
+                if result is not None:
+                    return result
+        return fragments.build_fragments(data, route, **params)
+
+    '''
+    Function: Drop the render processes; the next render starts new ones that load the current data
+    Parameters: None
+    Returns: None
+    '''
+    def reset(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None and self.pid == os.getpid():
+            executor.shutdown(wait=False)
+
+render_pool = RenderPool()
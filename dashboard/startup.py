@@ -0,0 +1,106 @@
+'''
+Import libraries
+'''
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import lazy
+
+'''
+How a gunicorn deployment warms up: 'preload' loads everything in the master before forking
+(workers share it copy-on-write), 'background' lets each worker serve at once and warm itself
+'''
+WARMUP = os.environ.get('MBD_WARMUP', 'preload')
+
+# Imported first by app.py, so this is close to when the dashboard's own imports started
+IMPORT_STARTED = time.perf_counter()
+
+'''
+Class: Startup timings and readiness of this process
+Attributes: milliseconds per startup step, whether a warm-up was started, ready event, error of a failed warm-up, warm-up thread
+'''
+class Startup:
+    def __init__(self):
+        self.timings = {}
+        self.started = False
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    '''
+    Function: Record how long a startup step took
+    Parameters: step name, milliseconds
+    Returns: None
+    '''
+    def record(self, name, elapsed_ms):
+        with self.lock:
+            self.timings[name] = elapsed_ms
+
+    '''
+    Function: Record how long a startup step took, from its start to now
+    Parameters: step name, time.perf_counter() value at the start of the step
+    Returns: None
+    '''
+    def record_since(self, name, start):
+        self.record(name, (time.perf_counter() - start) * 1000)
+
+    '''
+    Function: Run one warm-up step and record its timing
+    Parameters: step name, function
+    Returns: the function's result
+    '''
+    def run_step(self, name, function):
+        start = time.perf_counter()
+        result = function()
+        self.record_since(name, start)
+        return result
+
+    '''
+    Function: Run the warm-up steps and mark the process ready
+    Parameters: list of groups of (name, function) steps; steps of a group run concurrently, groups in order
+    Returns: None
+    '''
+    def run(self, groups):
+        start = time.perf_counter()
+        try:
+            for steps in groups:
+                # A fresh pool per group: no idle threads are left behind to be lost across a fork
+                with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix='warmup') as pool:
+                    futures = [pool.submit(self.run_step, name, function) for name, function in steps]
+                    for future in futures:
+                        future.result()
+        except Exception as e:
+            self.error = repr(e)
+            raise
+        self.record_since('warmup', start)
+        self.ready.set()
+
+    '''
+    Function: Warm up the process, in a background thread or before returning
+    Parameters: list of groups of (name, function) steps, run in the background
+    Returns: None
+    '''
+    def start(self, groups, background=False):
+        self.started = True
+        if not background:
+            self.run(groups)
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, args=(groups,), name='warmup', daemon=True)
+                self.thread.start()
+
+    '''
+    Function: Summarize readiness and timings
+    Parameters: None
+    Returns: dictionary of ready flag, error, startup step timings and lazy import timings in milliseconds
+    '''
+    def to_dict(self):
+        with self.lock:
+            timings = dict(self.timings)
+        return {'ready': self.ready.is_set(), 'error': self.error, 'pid': os.getpid(),
+                'timings_ms': timings, 'imports_ms': dict(lazy.import_timings)}
+
+state = Startup()
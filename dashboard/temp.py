@@ -1,10 +1,11 @@
 import pandas as pd
+import datastore
 
-df = pd.read_csv('data/train.csv')
-df['cfips'] = df['cfips'].apply(lambda x: '{0:0>5}'.format(x))
-
-census_df = pd.read_csv('data/census_starter.csv')
-census_df['cfips'] = census_df['cfips'].apply(lambda x: '{0:0>5}'.format(x))
+# Columnar copies when present (common/columnar.py), csv otherwise
+if datastore.use_columnar():
+    df, census_df = datastore.read_columnar_data()
+else:
+    df, census_df = datastore.read_csv_data()
 
 # broadband_df = census_df[['pct_bb_2017', 'pct_bb_2018', 'pct_bb_2019', 'pct_bb_2020', 'pct_bb_2021', 'cfips']]
 master_df = pd.merge(census_df, df, how="inner", on=["cfips"])
@@ -0,0 +1,39 @@
+'''
+WSGI entry point for serving the dashboard with several worker processes.
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:application   (from the dashboard directory)
+
+With MBD_WARMUP=preload (the default) the datasets, their derived tables and indexes, the county
+geometry, the prerendered manifest, the current forecast artifact and the landing page are loaded
+here, once, before the server forks its workers. Workers then share those pages copy-on-write
+instead of each holding a copy. With MBD_WARMUP=background nothing is loaded here: each worker
+serves as soon as it is forked and warms itself in a background thread (see /ready).
+'''
+
+'''
+Import libraries
+'''
+import gc
+import startup
+import render_pool
+import app as dashboard
+
+'''
+Function: Load everything the workers share before they are forked
+Parameters: None
+Returns: None
+'''
+def preload():
+    dashboard.warm_up()
+
+    # Render processes used for the landing page belong to the master; workers fork their own
+    render_pool.render_pool.reset()
+
+    # Collect now and move every surviving object to the permanent generation, so garbage
+    # collections in the workers do not write to (and so copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+if startup.WARMUP == 'preload':
+    preload()
+application = dashboard.app
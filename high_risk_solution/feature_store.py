@@ -0,0 +1,265 @@
+'''
+Dense feature store for the LightGBM pipeline.
+
+The panel is kept as counties x months arrays of microbusiness_density and active. Every
+feature of a month is a slice of those arrays (lags, rolling statistics) or a per-county row
+(census, state, county), so a month's feature block is computed once and kept. Appending a
+month computes only that month's block; writing predictions back into a month only
+invalidates the blocks that read it.
+'''
+
+'''
+Import libraries
+'''
+import numpy as np
+import pandas as pd
+
+'''
+Default feature settings, as in the high-risk notebook
+'''
+TIME_COLUMN = 'first_day_of_month'
+TARGET_COLUMN = 'microbusiness_density'
+LAGS = [1, 2, 3, 4, 5, 6]
+WINDOWS = [3, 6]
+ACTIVE_LAG = 8
+
+'''
+Class: Counties x months panel with per-month feature blocks
+Attributes: cfips, state and county of each row, month dates, density and active arrays,
+census array, feature settings, cached feature blocks by month index
+'''
+class FeatureStore:
+    def __init__(self, census_df=None, lags=LAGS, windows=WINDOWS, active_lag=ACTIVE_LAG):
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.active_lag = active_lag
+
+        self.cfips = np.zeros(0, dtype='int64')
+        self.row_of = {}
+        self.states = []
+        self.counties = []
+        self.months = []
+
+        # Arrays are allocated with spare month columns so appends do not copy the history
+        self.density = np.full((0, 0), np.nan)
+        self.active = np.full((0, 0), np.nan)
+        self.present = np.zeros((0, 0), dtype=bool)
+
+        if census_df is None:
+            census_df = pd.DataFrame(index=pd.Index([], name='cfips'))
+        census_df = census_df.drop(columns=[c for c in ('fips',) if c in census_df.columns])
+        self.census_df = census_df
+        self.census_columns = list(census_df.columns)
+        self.census = np.full((0, len(self.census_columns)), np.nan)
+        self.blocks = {}
+
+    '''
+    Function: Build a store from the train, test and census frames of the notebook
+    Parameters: train dataframe, test dataframe (or None), census dataframe indexed by cfips, feature settings
+    Returns: FeatureStore
+    '''
+    @classmethod
+    def from_frames(cls, train_df, test_df=None, census_df=None, **settings):
+        store = cls(census_df, **settings)
+        frames = [train_df] if test_df is None else [train_df, test_df]
+        store.append(pd.concat(frames, axis=0, ignore_index=True))
+        return store
+
+    '''
+    Function: Get the number of months in the store
+    Parameters: None
+    Returns: number of months
+    '''
+    def __len__(self):
+        return len(self.months)
+
+    '''
+    Function: Add rows for counties the store has not seen
+    Parameters: array of cfips, matching state and county arrays
+    Returns: None
+    '''
+    def add_counties(self, cfips, states, counties):
+        new = [i for i, value in enumerate(cfips) if value not in self.row_of]
+        if not new:
+            return
+        for i in new:
+            self.row_of[cfips[i]] = len(self.states)
+            self.states.append(states[i])
+            self.counties.append(counties[i])
+        self.cfips = np.append(self.cfips, [cfips[i] for i in new])
+        rows = len(new)
+
+        self.density = np.vstack([self.density, np.full((rows, self.density.shape[1]), np.nan)])
+        self.active = np.vstack([self.active, np.full((rows, self.active.shape[1]), np.nan)])
+        self.present = np.vstack([self.present, np.zeros((rows, self.present.shape[1]), dtype=bool)])
+        census = self.census_df.reindex(self.cfips[-rows:])[self.census_columns].to_numpy(dtype='float64')
+        self.census = np.vstack([self.census, census])
+
+        # Cached blocks do not have rows for the new counties
+        self.blocks = {}
+
+    '''
+    Function: Make room for more months, doubling the spare capacity
+    Parameters: number of months needed
+    Returns: None
+    '''
+    def reserve(self, num_months):
+        capacity = self.density.shape[1]
+        if num_months <= capacity:
+            return
+        capacity = max(num_months, 2 * capacity, 16)
+        for name in ('density', 'active', 'present'):
+            array = getattr(self, name)
+            grown = np.full((array.shape[0], capacity), np.nan if array.dtype.kind == 'f' else False, dtype=array.dtype)
+            grown[:, :array.shape[1]] = array
+            setattr(self, name, grown)
+
+    '''
+    Function: Append the rows of one or more new months (test months may have no target)
+    Parameters: long dataframe with cfips, first_day_of_month and optionally microbusiness_density, active, state, county
+    Returns: list of appended month indices
+    '''
+    def append(self, df):
+        dates = pd.to_datetime(df[TIME_COLUMN])
+        new_months = sorted(set(dates.unique()) - set(self.months))
+        if self.months and new_months and new_months[0] <= self.months[-1]:
+            raise ValueError('Months can only be appended after {}'.format(self.months[-1]))
+
+        # State and county are taken from any row of the county, as the notebook does for test rows
+        cfips = df['cfips'].to_numpy(dtype='int64')
+        unseen = ~np.isin(cfips, self.cfips)
+        if unseen.any():
+            rows = df.loc[unseen].drop_duplicates('cfips')
+            self.add_counties(rows['cfips'].to_numpy(dtype='int64'),
+                              rows['state'].astype(object).to_numpy() if 'state' in rows else [None] * len(rows),
+                              rows['county'].astype(object).to_numpy() if 'county' in rows else [None] * len(rows))
+
+        first = len(self.months)
+        self.months.extend(pd.Timestamp(month) for month in new_months)
+        self.reserve(len(self.months))
+
+        month_of = {month: i for i, month in enumerate(self.months)}
+        rows = np.array([self.row_of[value] for value in cfips])
+        columns = dates.map(month_of).to_numpy()
+        self.present[rows, columns] = True
+        for column, array in ((TARGET_COLUMN, self.density), ('active', self.active)):
+            if column in df.columns:
+                array[rows, columns] = df[column].to_numpy(dtype='float64')
+
+        # Values written into months the store already had (e.g. actuals of an earlier test month) change their features
+        for month in sorted(set(columns[columns < first].tolist())):
+            self.drop_blocks(month)
+        return list(range(first, len(self.months)))
+
+    '''
+    Function: Write values of one month, e.g. predictions of a forecast horizon
+    Parameters: month index, array of values in store row order (or with matching cfips), optional cfips
+    Returns: None
+    '''
+    def set_month(self, month, values, cfips=None):
+        if cfips is None:
+            self.density[:, month] = values
+        else:
+            self.density[[self.row_of[value] for value in cfips], month] = values
+
+        self.drop_blocks(month)
+
+    '''
+    Function: Drop the cached feature blocks that read a month's values: its own and those of the months
+    whose lags, rolling windows or lagged active count reach back to it
+    Parameters: month index
+    Returns: None
+    '''
+    def drop_blocks(self, month):
+        reach = max(self.lags + self.windows + [self.active_lag])
+        for later in range(month, month + reach + 1):
+            self.blocks.pop(later, None)
+
+    '''
+    Function: Get the names of the feature columns, in frame order
+    Parameters: None
+    Returns: list of column names
+    '''
+    def get_feature_columns(self):
+        rolling = ['rolling_{}({})'.format(stat, window) for window in self.windows for stat in ('mean', 'std')]
+        return (['cfips', 'county', 'state', 'active', 'year', 'month', 'scale']
+                + ['lags({})'.format(i) for i in self.lags] + rolling + self.census_columns)
+
+    '''
+    Function: Compute the numeric feature block of one month by slicing the panel
+    Parameters: month index
+    Returns: dictionary of column name -> array over store rows
+    '''
+    def build_block(self, month):
+        num_rows = len(self.cfips)
+        date = self.months[month]
+
+        def column(array, offset):
+            if month - offset < 0:
+                return np.full(num_rows, np.nan)
+            return array[:, month - offset].copy()
+
+        block = {'active': column(self.active, self.active_lag),
+                 'year': np.full(num_rows, date.year),
+                 'month': np.full(num_rows, date.month),
+                 'scale': np.full(num_rows, month)}
+        for i in self.lags:
+            block['lags({})'.format(i)] = column(self.density, i)
+        for window in self.windows:
+            history = self.density[:, max(month - window, 0):month]
+            if history.shape[1] < window:
+                block['rolling_mean({})'.format(window)] = np.full(num_rows, np.nan)
+                block['rolling_std({})'.format(window)] = np.full(num_rows, np.nan)
+            else:
+                block['rolling_mean({})'.format(window)] = history.mean(axis=1)
+                block['rolling_std({})'.format(window)] = history.std(axis=1)
+        return block
+
+    '''
+    Function: Get the cached feature block of a month, building it on first use
+    Parameters: month index
+    Returns: dictionary of column name -> array over store rows
+    '''
+    def get_block(self, month):
+        block = self.blocks.get(month)
+        if block is None:
+            block = self.blocks[month] = self.build_block(month)
+        return block
+
+    '''
+    Function: Get features and target of a range of months as one frame indexed by row_id
+    Parameters: first month index, month index after the last (None for all), include the target column
+    Returns: dataframe with the notebook's columns plus rolling statistics, one row per county and month in the data
+    '''
+    def get_frame(self, start=0, stop=None, target=True):
+        months = list(range(start, len(self.months) if stop is None else stop))
+        num_rows = len(self.cfips)
+        blocks = [self.get_block(month) for month in months]
+
+        columns = {'cfips': np.tile(self.cfips, len(months)),
+                   'county': pd.Categorical(np.tile(np.array(self.counties, dtype=object), len(months)), categories=sorted(set(self.counties) - {None})),
+                   'state': pd.Categorical(np.tile(np.array(self.states, dtype=object), len(months)), categories=sorted(set(self.states) - {None}))}
+        if target:
+            columns[TARGET_COLUMN] = self.density[:, months].T.ravel()
+        for name in blocks[0] if blocks else []:
+            columns[name] = np.concatenate([block[name] for block in blocks])
+        for i, name in enumerate(self.census_columns):
+            columns[name] = np.tile(self.census[:, i], len(months))
+
+        dates = np.repeat([self.months[month].strftime('%Y-%m-%d') for month in months], num_rows)
+        row_id = pd.Index(pd.Series(columns['cfips']).astype(str).to_numpy() + '_' + dates, name='row_id')
+
+        order = ['cfips', 'county', 'state'] + ([TARGET_COLUMN] if target else []) + self.get_feature_columns()[3:]
+        frame = pd.DataFrame(columns, index=row_id)[order]
+
+        # Counties missing from a month (e.g. absent from test.csv) have no row, as in the long frame
+        present = self.present[:, months].T.ravel()
+        return frame if present.all() else frame[present]
+
+    '''
+    Function: Get the month index of a date
+    Parameters: date
+    Returns: month index
+    '''
+    def get_month_index(self, date):
+        return self.months.index(pd.Timestamp(date))
@@ -0,0 +1,156 @@
+'''
+Recursive multi-step forecasting with the LightGBM model.
+
+Usage: python recursive_forecast.py DATA_DIR OUT_CSV [--params PARAMS_JSON] [--holdout 8]
+
+lags(1) is both a feature and the base of the percent-change target, so months after the
+first forecast month have no observed lags(1). The horizon is forecast one month at a time:
+all counties of month h are predicted in one batched call, the predictions are written into
+the feature store as that month's density, and month h+1 then reads them as its lags.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import json
+import os
+import sys
+import time
+import pandas as pd
+import lightgbm as lgb
+from feature_store import FeatureStore, TARGET_COLUMN
+
+# SMAPE is shared with the backtesting package at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backtesting.metrics import smape
+
+'''
+Fixed LightGBM settings of the notebook's objective
+'''
+DEFAULT_PARAMS = {
+    'n_estimators': 200,
+    'verbosity': -1,
+    'objective': 'l1',
+    'random_state': 42,
+    'extra_trees': True,
+}
+
+'''
+Function: Express the target relative to the previous month
+Parameters: feature frame, target values
+Returns: target divided by lags(1), 0 where lags(1) is 0
+'''
+def to_percent(X, y):
+    yhat = y / X['lags(1)']
+    yhat[X['lags(1)'] == 0] = 0 # denominator cannot be 0
+    return yhat
+
+'''
+Function: Convert relative predictions back to densities
+Parameters: feature frame, relative predictions
+Returns: predicted densities
+'''
+def from_percent(X, y):
+    return y * X['lags(1)'].to_numpy()
+
+'''
+Function: Get the feature columns the model is trained on
+Parameters: FeatureStore
+Returns: list of column names
+'''
+def get_model_columns(store):
+    return store.get_feature_columns()
+
+'''
+Function: Train the model on the months before a given month
+Parameters: FeatureStore, LightGBM parameters, month index after the last training month, predict relative change
+Returns: fitted LGBMRegressor
+'''
+def train_model(store, params, stop, percent=True):
+    # The first month has no lags, so training starts at month 1 as in the notebook
+    frame = store.get_frame(1, stop)
+    frame = frame[frame[TARGET_COLUMN].notna()]
+    X, y = frame[get_model_columns(store)], frame[TARGET_COLUMN]
+    if percent:
+        y = to_percent(X, y)
+
+    model = lgb.LGBMRegressor(**dict(DEFAULT_PARAMS, **params))
+    model.fit(X, y)
+    return model
+
+'''
+Function: Forecast consecutive months, feeding each month's predictions into the next month's lags
+Parameters: fitted model, FeatureStore, first forecast month index, number of months, model predicts relative change
+Returns: dataframe of predictions indexed by row_id
+'''
+def forecast_recursive(model, store, start, horizon, percent=True):
+    columns = get_model_columns(store)
+    predictions = []
+    for month in range(start, start + horizon):
+        # One batched predict per horizon step
+        X = store.get_frame(month, month + 1, target=False)
+        y_pred = model.predict(X[columns])
+        if percent:
+            y_pred = from_percent(X, y_pred)
+
+        # Written back in place so month + 1 sees these values as lags(1)
+        store.set_month(month, y_pred, X['cfips'].to_numpy())
+        predictions.append(pd.DataFrame({'cfips': X['cfips'].to_numpy(), TARGET_COLUMN: y_pred}, index=X.index))
+    return pd.concat(predictions)
+
+'''
+Function: Score recursive forecasting on the last months of the train data
+Parameters: FeatureStore of the train data, LightGBM parameters, held out months, predict relative change
+Returns: dictionary of SMAPE per horizon step and overall
+'''
+def evaluate_holdout(store, params, holdout=8, percent=True):
+    start = len(store) - holdout
+    actual = store.get_frame(start, len(store))[TARGET_COLUMN]
+    model = train_model(store, params, start, percent)
+
+    predicted = forecast_recursive(model, store, start, holdout, percent)[TARGET_COLUMN]
+    steps = (store.get_frame(start, len(store), target=False)['scale'] - start + 1).to_numpy()
+    scores = {'step {}'.format(step): smape(actual.to_numpy()[steps == step], predicted.to_numpy()[steps == step])
+              for step in range(1, holdout + 1)}
+    scores['overall'] = smape(actual.to_numpy(), predicted.to_numpy())
+    return scores
+
+'''
+Function: Read the competition files of a data directory
+Parameters: data directory
+Returns: train dataframe, test dataframe, census dataframe indexed by cfips
+'''
+def read_data(data_dir):
+    train_df = pd.read_csv(os.path.join(data_dir, 'train.csv'))
+    test_df = pd.read_csv(os.path.join(data_dir, 'test.csv'))
+    census_df = pd.read_csv(os.path.join(data_dir, 'census_starter.csv'), index_col='cfips')
+    return train_df, test_df, census_df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recursive multi-step LightGBM forecast')
+    parser.add_argument('data_dir')
+    parser.add_argument('out')
+    parser.add_argument('--params', default=None, help='json file of LightGBM parameters, e.g. the tuned best_params')
+    parser.add_argument('--holdout', type=int, default=0, help='first score recursive forecasting on this many train months')
+    args = parser.parse_args()
+
+    params = {}
+    if args.params is not None:
+        with open(args.params) as f:
+            params = json.load(f)
+    train_df, test_df, census_df = read_data(args.data_dir)
+
+    if args.holdout:
+        for name, score in evaluate_holdout(FeatureStore.from_frames(train_df, None, census_df), params, args.holdout).items():
+            print('Holdout SMAPE {:<8}{:.3f}'.format(name, score))
+
+    start = time.time()
+    store = FeatureStore.from_frames(train_df, test_df, census_df)
+    first_test_month = store.get_month_index(pd.to_datetime(test_df['first_day_of_month']).min())
+    model = train_model(store, params, first_test_month)
+    predictions = forecast_recursive(model, store, first_test_month, len(store) - first_test_month)
+    print('Forecast {} rows in {:.1f}s'.format(len(predictions), time.time() - start))
+
+    submission = test_df[['row_id']].merge(predictions[[TARGET_COLUMN]], left_on='row_id', right_index=True, how='left')
+    submission.to_csv(args.out, index=False)
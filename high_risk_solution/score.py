@@ -0,0 +1,287 @@
+'''
+Batch scoring of test.csv-shaped files with a registered model.
+
+Usage:
+  python score.py train DATA_DIR --name lgbm [--params PARAMS_JSON]
+  python score.py score DATA_DIR INPUT_CSV OUT_CSV --model lgbm [--workers N] [--chunk-size 20000]
+
+train fits the LightGBM model on every train month and registers it under models/NAME; it is
+the only kind train produces. score loads any kind listed in MODEL_LOADERS.
+
+score precomputes one feature table for every county and month up to the last month of the
+input: observed months come from the train data and later months are filled by the model's
+own recursive forecast. The table is written once as an uncompressed Arrow file that the
+workers memory-map. The input is then streamed in chunks; each row's features are found by
+position (month index x counties + county row) and any input column named like a feature
+overrides it, which is how what-if scenarios are scored. Output is written chunk by chunk in
+input order, keeping row_id and an optional scenario column.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import lightgbm as lgb
+from feature_store import FeatureStore, TIME_COLUMN, TARGET_COLUMN
+from recursive_forecast import read_data, train_model, forecast_recursive, get_model_columns
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+PASSTHROUGH_COLUMNS = ['row_id', 'scenario']
+
+# Model and feature table of the current worker process
+_worker = {}
+
+'''
+Function: Train the model on all train months and register it
+Parameters: data directory, model name, LightGBM parameters, registry directory
+Returns: model directory
+'''
+def register_model(data_dir, name, params=None, root=MODEL_DIR):
+    train_df, _, census_df = read_data(data_dir)
+    store = FeatureStore.from_frames(train_df, None, census_df)
+    model = train_model(store, params or {}, len(store))
+
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    model.booster_.save_model(os.path.join(path, 'model.txt'))
+    meta = {'kind': 'lightgbm', 'features': get_model_columns(store), 'percent': True, 'params': params or {},
+            'trained_months': [store.months[0].strftime('%Y-%m-%d'), store.months[-1].strftime('%Y-%m-%d')],
+            'created': time.time()}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+'''
+Class: A registered LightGBM model behind the interface score.py scores any model through
+Attributes: booster, feature columns in training order, whether the booster predicts the change relative to lags(1)
+'''
+class LightGBMModel:
+    def __init__(self, booster, meta):
+        self.booster = booster
+        self.features = meta['features']
+        self.percent = meta['percent']
+
+    '''
+    Function: Predict the booster's target, as forecast_recursive expects
+    Parameters: feature dataframe
+    Returns: array of predictions
+    '''
+    def predict(self, X):
+        return self.booster.predict(X)
+
+    '''
+    Function: Predict microbusiness density
+    Parameters: feature dataframe
+    Returns: array of densities
+    '''
+    def predict_density(self, X):
+        y_pred = self.predict(X)
+        if self.percent:
+            y_pred = y_pred * X['lags(1)'].to_numpy()
+        return y_pred
+
+'''
+Function: Load a registered LightGBM model
+Parameters: model directory, model metadata
+Returns: LightGBMModel
+'''
+def load_lightgbm(path, meta):
+    return LightGBMModel(lgb.Booster(model_file=os.path.join(path, 'model.txt')), meta)
+
+'''
+Loaders by the kind recorded in a model's meta.json. Each returns a model with features (the feature
+table columns it reads), percent, predict (its own target, used by the recursive forecast) and
+predict_density; train registers LightGBM models only
+'''
+MODEL_LOADERS = {
+    'lightgbm': load_lightgbm,
+}
+
+'''
+Function: Load a registered model
+Parameters: model name, registry directory
+Returns: model loaded by the loader of its kind, metadata
+'''
+def load_model(name, root=MODEL_DIR):
+    path = os.path.join(root, name)
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        raise FileNotFoundError('No model registered as {} in {}; run "python score.py train" first'.format(name, root))
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    kind = meta.get('kind')
+    if kind not in MODEL_LOADERS:
+        raise ValueError('Model {} is of kind {!r}; score.py can load {}'.format(name, kind, ', '.join(sorted(MODEL_LOADERS))))
+    return MODEL_LOADERS[kind](path, meta), meta
+
+'''
+Function: Get the last month referenced by the input, reading only its month column
+Parameters: input csv path, chunk size
+Returns: last month as a timestamp
+'''
+def get_last_month(input_path, chunk_size):
+    last = None
+    for chunk in pd.read_csv(input_path, usecols=[TIME_COLUMN], chunksize=chunk_size):
+        month = pd.to_datetime(chunk[TIME_COLUMN]).max()
+        last = month if last is None or month > last else last
+    return last
+
+'''
+Function: Build the feature table of every county and month and write it as an Arrow file
+Parameters: data directory, loaded model, last month to cover, output path
+Returns: cfips array in store row order, list of month strings, dictionary of categorical column -> categories
+'''
+def build_feature_table(data_dir, model, last_month, path):
+    train_df, _, census_df = read_data(data_dir)
+    store = FeatureStore.from_frames(train_df, None, census_df)
+    observed = len(store)
+
+    # Months after the data have no observed lags; fill them with the model's recursive forecast
+    future = pd.date_range(store.months[-1], last_month, freq='MS')[1:]
+    if len(future):
+        cfips = store.cfips
+        store.append(pd.DataFrame({'cfips': np.repeat(cfips, len(future)),
+                                   TIME_COLUMN: np.tile(future.strftime('%Y-%m-%d'), len(cfips))}))
+        forecast_recursive(model, store, observed, len(future), model.percent)
+
+    # Rows are month-major in store row order; missing county months are kept so positions are fixed
+    store.present[:, :len(store)] = True
+    frame = store.get_frame(0, target=False)[model.features]
+
+    # One chunk of plain arrays (categorical codes, NaN instead of nulls), so workers can view every column without a copy
+    arrays, categories = {}, {}
+    for name in frame.columns:
+        if isinstance(frame[name].dtype, pd.CategoricalDtype):
+            categories[name] = list(frame[name].cat.categories)
+            arrays[name] = pa.array(frame[name].cat.codes.to_numpy())
+        else:
+            arrays[name] = pa.array(frame[name].to_numpy(), from_pandas=False)
+    feather.write_feather(pa.table(arrays), path, compression='uncompressed', chunksize=max(len(frame), 1))
+    return store.cfips, [month.strftime('%Y-%m-%d') for month in store.months], categories
+
+'''
+Function: Initialize a worker process with the model and the memory-mapped feature table
+Parameters: model name, registry directory, feature table path, cfips array, month strings, categories of categorical columns
+Returns: None
+'''
+def init_worker(model_name, root, table_path, cfips, months, categories):
+    _worker['model'], _ = load_model(model_name, root)
+
+    # Numpy views of the mapped columns: every worker shares the file's pages and copies only the rows it scores
+    table = feather.read_table(table_path, memory_map=True)
+    _worker['table'] = table
+    _worker['columns'] = {name: table.column(name).chunk(0).to_numpy(zero_copy_only=True) for name in table.column_names}
+    _worker['categories'] = categories
+    _worker['order'] = np.argsort(cfips, kind='stable')
+    _worker['sorted_cfips'] = cfips[_worker['order']]
+    _worker['month_index'] = {month: i for i, month in enumerate(months)}
+
+'''
+Function: Score one chunk of input rows
+Parameters: input chunk
+Returns: dataframe of passthrough columns and microbusiness_density
+'''
+def score_chunk(chunk):
+    columns, categories, sorted_cfips = _worker['columns'], _worker['categories'], _worker['sorted_cfips']
+    num_counties = len(sorted_cfips)
+
+    # Indexed lookup: a binary search over sorted cfips gives the county row, the month dictionary the month block
+    sorted_rows = np.minimum(np.searchsorted(sorted_cfips, chunk['cfips'].to_numpy()), num_counties - 1)
+    known = sorted_cfips[sorted_rows] == chunk['cfips'].to_numpy()
+    county_rows = _worker['order'][sorted_rows]
+    month_rows = pd.to_datetime(chunk[TIME_COLUMN]).dt.strftime('%Y-%m-%d').map(_worker['month_index'])
+    known &= month_rows.notna().to_numpy()
+    positions = np.where(known, month_rows.fillna(0).to_numpy(dtype='int64') * num_counties + county_rows, 0)
+
+    X = pd.DataFrame({name: pd.Categorical.from_codes(values[positions], categories[name]) if name in categories else values[positions]
+                      for name, values in columns.items()})
+    for column in X.columns:
+        if column in chunk.columns and column not in ('cfips', 'county', 'state'):
+            X[column] = chunk[column].to_numpy()
+
+    y_pred = _worker['model'].predict_density(X)
+    y_pred[~known] = np.nan
+
+    result = chunk[[column for column in PASSTHROUGH_COLUMNS if column in chunk.columns]].reset_index(drop=True)
+    result[TARGET_COLUMN] = y_pred
+    return result
+
+'''
+Function: Score an input file with a registered model and write the submission incrementally
+Parameters: data directory, input csv, output csv, model name, worker processes, rows per chunk, registry directory
+Returns: number of rows scored
+'''
+def score(data_dir, input_path, out_path, model_name, workers=None, chunk_size=20000, root=MODEL_DIR):
+    start = time.time()
+    model, _ = load_model(model_name, root)
+    last_month = get_last_month(input_path, chunk_size)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_path = os.path.join(tmp_dir, 'features.arrow')
+        cfips, months, categories = build_feature_table(data_dir, model, last_month, table_path)
+        print('Built features for {} counties x {} months ({:.1f}s)'.format(len(cfips), len(months), time.time() - start))
+
+        start = time.time()
+        rows = 0
+        workers = workers or os.cpu_count()
+        tmp_out = out_path + '.tmp'
+        with open(tmp_out, 'w', newline='') as out, \
+             ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(model_name, root, table_path, cfips, months, categories)) as pool:
+            # At most two chunks per worker are in flight, so memory stays bounded
+            pending = deque()
+
+            def write_next():
+                result = pending.popleft().result()
+                result.to_csv(out, index=False, header=out.tell() == 0)
+                return len(result)
+
+            for chunk in pd.read_csv(input_path, chunksize=chunk_size):
+                pending.append(pool.submit(score_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    rows += write_next()
+            while pending:
+                rows += write_next()
+        os.replace(tmp_out, out_path)
+
+    seconds = time.time() - start
+    print('Scored {} rows in {:.1f}s ({:.0f} rows/s)'.format(rows, seconds, rows / max(seconds, 1e-9)))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch scoring with a registered model')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='train a LightGBM model on all train months and register it')
+    train_parser.add_argument('data_dir')
+    train_parser.add_argument('--name', required=True)
+    train_parser.add_argument('--params', default=None, help='json file of LightGBM parameters, e.g. the tuned best_params')
+    train_parser.add_argument('--root', default=MODEL_DIR)
+
+    score_parser = commands.add_parser('score', help='score a test.csv-shaped file')
+    score_parser.add_argument('data_dir')
+    score_parser.add_argument('input')
+    score_parser.add_argument('out')
+    score_parser.add_argument('--model', required=True)
+    score_parser.add_argument('--workers', type=int, default=None)
+    score_parser.add_argument('--chunk-size', type=int, default=20000)
+    score_parser.add_argument('--root', default=MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        params = None
+        if args.params is not None:
+            with open(args.params) as f:
+                params = json.load(f)
+        print(register_model(args.data_dir, args.name, params, args.root))
+    else:
+        score(args.data_dir, args.input, args.out, args.model, args.workers, args.chunk_size, args.root)
@@ -0,0 +1,195 @@
+'''
+Parallel, resumable Optuna tuning of the LightGBM model.
+
+Usage: python tuning.py DATA_DIR [--storage tuning/study.log] [--study Regressor] [--trials 30] [--workers N]
+
+Trials are kept in a persistent storage (an Optuna journal file, or SQLite when the path ends
+in .db), so several worker processes share one study and a rerun continues an interrupted
+study until it has --trials finished trials. Each worker builds the LightGBM Dataset of the
+time-based fold once and reuses it for all of its trials; trials whose validation SMAPE falls
+behind the median of earlier trials are pruned part way through training.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import lightgbm as lgb
+import optuna
+from feature_store import FeatureStore, TARGET_COLUMN
+from recursive_forecast import read_data, to_percent, from_percent, get_model_columns
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backtesting.metrics import smape
+
+'''
+Fixed training settings of the notebook's objective
+'''
+NUM_BOOST_ROUND = 200
+REPORT_EVERY = 25
+FIXED_PARAMS = {
+    'verbosity': -1,
+    'objective': 'l1',
+    'random_state': 42,
+    'extra_trees': True,
+}
+
+# Fold of the current worker process, built once and shared by its trials
+_fold = {}
+
+'''
+Function: Open the persistent storage of a study
+Parameters: storage path (.db for SQLite, anything else for a journal file)
+Returns: Optuna storage
+'''
+def get_storage(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.db'):
+        return optuna.storages.RDBStorage('sqlite:///{}'.format(path), engine_kwargs={'connect_args': {'timeout': 60}})
+
+    # The journal file is safe for several processes appending at once
+    try:
+        from optuna.storages.journal import JournalFileBackend
+        return optuna.storages.JournalStorage(JournalFileBackend(path))
+    except ImportError:
+        return optuna.storages.JournalStorage(optuna.storages.JournalFileStorage(path))
+
+'''
+Function: Build the training Dataset and validation frame of the time-based fold
+Parameters: data directory, number of validation months at the end of train, LightGBM threads
+Returns: None (stored in the worker's fold)
+'''
+def init_worker(data_dir, valid_months, num_threads):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    train_df, _, census_df = read_data(data_dir)
+    store = FeatureStore.from_frames(train_df, None, census_df)
+    columns = get_model_columns(store)
+
+    valid_start = len(store) - valid_months
+    train_frame = store.get_frame(1, valid_start)
+    valid_frame = store.get_frame(valid_start, len(store))
+    X_train = train_frame[columns]
+
+    # Binning is fixed at construction; feature_pre_filter is off so min_data_in_leaf can vary per trial
+    dataset = lgb.Dataset(X_train, to_percent(X_train, train_frame[TARGET_COLUMN]),
+                          params={'feature_pre_filter': False, 'verbosity': -1}, free_raw_data=False)
+    dataset.construct()
+
+    _fold['dataset'] = dataset
+    _fold['X_valid'] = valid_frame[columns]
+    _fold['y_valid'] = valid_frame[TARGET_COLUMN].to_numpy()
+    _fold['num_threads'] = num_threads
+
+'''
+Function: Sample the parameters of a trial, as in the notebook's lgbm_objective
+Parameters: Optuna trial
+Returns: dictionary of LightGBM parameters
+'''
+def suggest_params(trial):
+    return {
+        'colsample_bytree' : trial.suggest_float('colsample_bytree', 0.1, 1.0),
+        'colsample_bynode' : trial.suggest_float('colsample_bynode', 0.1, 1.0),
+        'max_depth'        : trial.suggest_int('max_depth', 3, 10),
+        'learning_rate'    : trial.suggest_float('learning_rate', 0.01, 0.1, log=True),
+        'lambda_l1'        : trial.suggest_float('lambda_l1', 1e-2, 10.0),
+        'lambda_l2'        : trial.suggest_float('lambda_l2', 1e-2, 10.0),
+        'num_leaves'       : trial.suggest_int('num_leaves', 8, 1024),
+        'min_data_in_leaf' : trial.suggest_int('min_data_in_leaf', 5, 250),}
+
+'''
+Function: Get the validation SMAPE of a booster after some boosting rounds
+Parameters: booster, number of rounds
+Returns: SMAPE
+'''
+def get_valid_smape(booster, num_iteration):
+    X_valid = _fold['X_valid']
+    y_pred = from_percent(X_valid, booster.predict(X_valid, num_iteration=num_iteration))
+    return smape(_fold['y_valid'], y_pred)
+
+'''
+Function: Train one trial on the cached Dataset, reporting intermediate SMAPE for pruning
+Parameters: Optuna trial
+Returns: validation SMAPE
+'''
+def objective(trial):
+    params = dict(FIXED_PARAMS, num_threads=_fold['num_threads'], **suggest_params(trial))
+
+    def report(env):
+        step = env.iteration + 1
+        if step % REPORT_EVERY == 0 and step < NUM_BOOST_ROUND:
+            trial.report(get_valid_smape(env.model, step), step)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+
+    booster = lgb.train(params, _fold['dataset'], num_boost_round=NUM_BOOST_ROUND, callbacks=[report])
+    return get_valid_smape(booster, NUM_BOOST_ROUND)
+
+'''
+Function: Load the study, creating it on first use
+Parameters: storage path, study name
+Returns: Optuna study
+'''
+def load_study(storage_path, study_name):
+    return optuna.create_study(study_name=study_name, storage=get_storage(storage_path), direction='minimize',
+                               load_if_exists=True,
+                               pruner=optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=REPORT_EVERY))
+
+'''
+Function: Run trials in one worker process until the study has enough finished trials
+Parameters: data directory, storage path, study name, total trials, validation months, LightGBM threads
+Returns: None
+'''
+def run_worker(data_dir, storage_path, study_name, num_trials, valid_months, num_threads):
+    init_worker(data_dir, valid_months, num_threads)
+    study = load_study(storage_path, study_name)
+    states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+    if len(study.get_trials(deepcopy=False, states=states)) < num_trials:
+        study.optimize(objective, callbacks=[optuna.study.MaxTrialsCallback(num_trials, states=states)])
+
+'''
+Function: Tune the model across worker processes and write the best parameters
+Parameters: data directory, storage path, study name, total trials, worker processes, validation months, output json path
+Returns: best parameters
+'''
+def tune(data_dir, storage_path='tuning/study.log', study_name='Regressor', num_trials=30, workers=None, valid_months=1, out=None):
+    workers = workers or os.cpu_count()
+    num_threads = max(1, os.cpu_count() // workers)
+
+    # Create the study once up front so the workers do not race to create it
+    study = load_study(storage_path, study_name)
+    finished = len([t for t in study.get_trials(deepcopy=False) if t.state.is_finished()])
+    print('Study {} has {} finished trials'.format(study_name, finished))
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_worker, data_dir, storage_path, study_name, num_trials, valid_months, num_threads)
+                   for _ in range(workers)]
+        for future in futures:
+            future.result()
+
+    study = load_study(storage_path, study_name)
+    ran = len([t for t in study.get_trials(deepcopy=False) if t.state.is_finished()]) - finished
+    pruned = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.PRUNED,)))
+    print('Ran {} trials in {:.0f}s; {} pruned overall; best SMAPE {:.4f}'.format(ran, time.time() - start, pruned, study.best_value))
+
+    if out is not None:
+        with open(out, 'w') as f:
+            json.dump(study.best_params, f, indent=2)
+    return study.best_params
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel, resumable Optuna tuning of the LightGBM model')
+    parser.add_argument('data_dir')
+    parser.add_argument('--storage', default='tuning/study.log', help='journal file, or a .db path for SQLite')
+    parser.add_argument('--study', default='Regressor')
+    parser.add_argument('--trials', type=int, default=30, help='finished trials the study should reach')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--valid-months', type=int, default=1)
+    parser.add_argument('--out', default='tuning/best_params.json')
+    args = parser.parse_args()
+    print(tune(args.data_dir, args.storage, args.study, args.trials, args.workers, args.valid_months, args.out))
@@ -0,0 +1,158 @@
+'''
+Baseline forecasts for every county at once.
+
+Usage: python batch_forecast.py TRAIN_CSV OUT_CSV [--method arima_110] [--periods 8] [--test TEST_CSV]
+
+All county series are held as one counties x months array and each method forecasts every
+row in a single vectorized pass:
+  - naive: last value (the ARIMA(0,1,0) random walk used in the notebook)
+  - drift: random walk with the average historical change
+  - seasonal_naive: value of the same month one season earlier
+  - arima_110: AR(1) on the first differences, fitted by least squares per county
+  - ses: simple exponential smoothing with the smoothing weight chosen per county from a grid
+The last PERIODS months are held out first to print each method's SMAPE.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# The panel builder and SMAPE are shared with the backtesting package at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backtesting.folds import build_panel, fill_missing
+from backtesting.metrics import smape
+
+'''
+Function: Random walk forecast
+Parameters: counties x months array, forecast periods
+Returns: counties x periods array
+'''
+def forecast_naive(values, periods):
+    return np.repeat(values[:, -1:], periods, axis=1)
+
+'''
+Function: Random walk with drift forecast
+Parameters: counties x months array, forecast periods
+Returns: counties x periods array
+'''
+def forecast_drift(values, periods):
+    slope = (values[:, -1] - values[:, 0]) / (values.shape[1] - 1)
+    return values[:, -1:] + slope[:, None] * np.arange(1, periods + 1)
+
+'''
+Function: Seasonal naive forecast
+Parameters: counties x months array, forecast periods, season length in months
+Returns: counties x periods array
+'''
+def forecast_seasonal_naive(values, periods, season=12):
+    if values.shape[1] < season:
+        return forecast_naive(values, periods)
+    steps = np.arange(periods) % season
+    return values[:, values.shape[1] - season + steps]
+
+'''
+Function: ARIMA(1,1,0) forecast, an AR(1) without constant on the first differences
+Parameters: counties x months array, forecast periods
+Returns: counties x periods array
+'''
+def forecast_arima_110(values, periods):
+    diffs = np.diff(values, axis=1)
+    previous, current = diffs[:, :-1], diffs[:, 1:]
+
+    # Least squares coefficient per county, kept inside the stationary region
+    denominator = (previous * previous).sum(axis=1)
+    phi = np.divide((previous * current).sum(axis=1), denominator, out=np.zeros(len(values)), where=denominator > 0)
+    phi = np.clip(phi, -0.99, 0.99)
+
+    # Forecast differences decay as phi^k and are accumulated onto the last value
+    future_diffs = diffs[:, -1:] * phi[:, None] ** np.arange(1, periods + 1)
+    return values[:, -1:] + np.cumsum(future_diffs, axis=1)
+
+'''
+Function: Simple exponential smoothing forecast with the smoothing weight picked per county
+Parameters: counties x months array, forecast periods, grid of smoothing weights
+Returns: counties x periods array
+'''
+def forecast_ses(values, periods, alphas=np.linspace(0.05, 1.0, 20)):
+    # Every weight is run at once: levels is counties x weights
+    levels = np.repeat(values[:, :1], len(alphas), axis=1)
+    errors = np.zeros_like(levels)
+    for t in range(1, values.shape[1]):
+        residual = values[:, t:t + 1] - levels
+        errors += residual * residual
+        levels += alphas * residual
+
+    best = np.argmin(errors, axis=1)
+    return np.repeat(levels[np.arange(len(values)), best][:, None], periods, axis=1)
+
+'''
+Forecasting methods by name
+'''
+METHODS = {
+    'naive': forecast_naive,
+    'drift': forecast_drift,
+    'seasonal_naive': forecast_seasonal_naive,
+    'arima_110': forecast_arima_110,
+    'ses': forecast_ses,
+}
+
+'''
+Function: Run several methods over the whole panel
+Parameters: counties x months array, forecast periods, list of method names (None for all)
+Returns: dictionary of method name -> counties x periods array
+'''
+def forecast_all(values, periods, methods=None):
+    return {name: METHODS[name](values, periods) for name in (methods or METHODS)}
+
+'''
+Function: Hold out the last months and score every method on them
+Parameters: counties x months array (NaN where missing), held out periods, list of method names (None for all)
+Returns: dictionary of method name -> SMAPE over the held out months that have actual values
+'''
+def evaluate_holdout(values, periods, methods=None):
+    train, actual = fill_missing(values[:, :-periods]), values[:, -periods:]
+    return {name: smape(actual, forecast) for name, forecast in forecast_all(train, periods, methods).items()}
+
+'''
+Function: Convert a forecast array to the long submission shape
+Parameters: array of cfips, DatetimeIndex of the training months, counties x periods array
+Returns: dataframe (row_id, cfips, first_day_of_month, microbusiness_density)
+'''
+def to_frame(cfips, months, forecast):
+    future = pd.date_range(months[-1], periods=forecast.shape[1] + 1, freq='MS')[1:].strftime('%Y-%m-%d')
+    cfips_column = np.repeat(cfips, len(future))
+    month_column = np.tile(np.asarray(future), len(cfips))
+    return pd.DataFrame({'row_id': pd.Series(cfips_column).astype(str) + '_' + month_column,
+                         'cfips': cfips_column,
+                         'first_day_of_month': month_column,
+                         'microbusiness_density': forecast.ravel()})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vectorized baseline forecasts for every county')
+    parser.add_argument('train')
+    parser.add_argument('out')
+    parser.add_argument('--method', default='arima_110', choices=sorted(METHODS))
+    parser.add_argument('--periods', type=int, default=8)
+    parser.add_argument('--test', default=None, help='test.csv; when given, only its rows are written')
+    args = parser.parse_args()
+
+    cfips, months, values = build_panel(pd.read_csv(args.train))
+    print('{} counties x {} months'.format(*values.shape))
+
+    for name, score in evaluate_holdout(values, args.periods).items():
+        print('Holdout SMAPE {:<15}{:.3f}'.format(name, score))
+
+    start = time.time()
+    forecast = METHODS[args.method](fill_missing(values), args.periods)
+    print('Forecast {} counties with {} in {:.3f}s'.format(len(cfips), args.method, time.time() - start))
+
+    forecast_df = to_frame(cfips, months, forecast)
+    if args.test is not None:
+        forecast_df = pd.read_csv(args.test)[['row_id']].merge(forecast_df[['row_id', 'microbusiness_density']], on='row_id', how='left')
+    forecast_df.to_csv(args.out, index=False)
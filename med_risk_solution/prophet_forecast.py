@@ -0,0 +1,209 @@
+'''
+Fit one Prophet model per county across a process pool.
+
+Usage: python prophet_forecast.py TRAIN_CSV OUT_DIR [--test TEST_CSV] [--periods 8] [--workers N] [--chunk-size 50]
+
+The train frame is split into per-county series once. Counties are fitted in fixed chunks;
+each finished chunk is written to OUT_DIR/chunks, so a crashed or interrupted run resumes
+from the chunks that are missing. OUT_DIR/forecast.csv holds the combined submission.
+'''
+
+'''
+Import libraries
+'''
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from scipy.stats import boxcox
+from scipy.special import inv_boxcox
+
+'''
+Model settings used by the medium-risk notebook
+'''
+PROPHET_PARAMS = dict(weekly_seasonality=False,
+                      yearly_seasonality=False,
+                      daily_seasonality=False,
+                      n_changepoints=10,
+                      changepoint_prior_scale=0.5,
+                      growth='linear')
+
+# State kept by each worker process between chunks
+_worker = {}
+
+'''
+Function: Split the train frame into one series per county with a single sort
+Parameters: train dataframe, date column, target column
+Returns: dictionary of cfips -> (dates, values)
+'''
+def group_series(df, date_column='first_day_of_month', target_column='microbusiness_density'):
+    df = df[['cfips', date_column, target_column]].sort_values(['cfips', date_column], kind='stable')
+    cfips = df['cfips'].to_numpy()
+    dates = pd.to_datetime(df[date_column]).to_numpy()
+    values = df[target_column].to_numpy(dtype='float64')
+
+    # Rows are contiguous per county after the sort
+    starts = np.flatnonzero(np.r_[True, cfips[1:] != cfips[:-1]])
+    stops = np.r_[starts[1:], len(cfips)]
+    return {int(cfips[start]): (dates[start:stop], values[start:stop]) for start, stop in zip(starts, stops)}
+
+'''
+Function: Initialize a worker process
+Parameters: box-cox lambda, forecast periods
+Returns: None
+'''
+def init_worker(lam, periods):
+    # cmdstanpy logs every fit at INFO level and resets its level lazily, so disable it outright
+    logging.getLogger('cmdstanpy').disabled = True
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+    _worker['lam'] = lam
+    _worker['periods'] = periods
+    _worker['init'] = None
+
+'''
+Function: Get the fitted parameters of a model as a warm start for the next fit
+Parameters: fitted Prophet model
+Returns: dictionary of initial values for stan
+'''
+def get_warm_start(model):
+    params = {}
+    for name in ['k', 'm', 'sigma_obs']:
+        params[name] = model.params[name][0][0]
+    for name in ['delta', 'beta']:
+        params[name] = model.params[name][0]
+    return params
+
+'''
+Function: Get the length of Prophet's changepoint adjustments (delta) for a history, as Prophet's set_changepoints computes it
+Parameters: number of history rows
+Returns: length of delta
+'''
+def get_delta_size(num_rows):
+    hist_size = int(np.floor(num_rows * PROPHET_PARAMS.get('changepoint_range', 0.8)))
+    n_changepoints = min(PROPHET_PARAMS['n_changepoints'], hist_size - 1)
+
+    # Without changepoints Prophet still fits one dummy delta
+    return max(n_changepoints, 1)
+
+'''
+Function: Fit one county and forecast the next periods
+Parameters: dates, observed values
+Returns: forecast dates, forecast values
+'''
+def fit_county(dates, values):
+    from prophet import Prophet
+
+    lam = _worker['lam']
+    periods = _worker['periods']
+    history = pd.DataFrame({'ds': dates, 'y': boxcox(np.maximum(values, 1e-7), lam)})
+
+    # Neighbouring counties have similar fits, so the previous fit in this worker is a good start
+    init = _worker['init']
+    if init is not None and len(init['delta']) != get_delta_size(len(history)):
+        init = None
+    model = None
+    if init is not None:
+        try:
+            model = Prophet(**PROPHET_PARAMS).fit(history, init=init)
+        except Exception:
+            # A warm start stan rejects is dropped; a model cannot be fitted twice, so the cold fit uses a new one
+            model = None
+    if model is None:
+        model = Prophet(**PROPHET_PARAMS).fit(history)
+    _worker['init'] = get_warm_start(model)
+
+    # Only the horizon is predicted, not the fitted history
+    future = model.make_future_dataframe(periods=periods, freq='MS', include_history=False)
+    forecast = model.predict(future)
+    return future['ds'].to_numpy(), inv_boxcox(forecast['yhat'].to_numpy(), lam)
+
+'''
+Function: Fit a chunk of counties and write their forecasts
+Parameters: output path of the chunk, list of (cfips, dates, values)
+Returns: number of counties fitted
+'''
+def fit_chunk(path, series):
+    rows = []
+    for cfips, dates, values in series:
+        forecast_dates, forecast_values = fit_county(dates, values)
+        for date, value in zip(pd.to_datetime(forecast_dates), forecast_values):
+            rows.append(('{}_{}'.format(cfips, date.strftime('%Y-%m-%d')), cfips, date.strftime('%Y-%m-%d'), value))
+
+    chunk_df = pd.DataFrame(rows, columns=['row_id', 'cfips', 'first_day_of_month', 'microbusiness_density'])
+    tmp_path = path + '.tmp'
+    chunk_df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return len(series)
+
+'''
+Function: Check that a resumed run uses the same settings as the chunks already written
+Parameters: output directory, run settings
+Returns: None
+'''
+def check_run_config(out_dir, config):
+    path = os.path.join(out_dir, 'run.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != config:
+            raise ValueError('{} was written with different settings {}; use a new output directory'.format(out_dir, previous))
+    else:
+        with open(path, 'w') as f:
+            json.dump(config, f)
+
+'''
+Function: Forecast every county in parallel, resuming from chunks already written
+Parameters: train dataframe, output directory, forecast periods, worker processes, counties per chunk,
+box-cox lambda (estimated from the data when None), date column
+Returns: dataframe of forecasts (row_id, cfips, first_day_of_month, microbusiness_density)
+'''
+def forecast_counties(df, out_dir, periods=8, workers=None, chunk_size=50, lam=None, date_column='first_day_of_month'):
+    series = group_series(df, date_column)
+    if lam is None:
+        _, lam = boxcox(np.maximum(df['microbusiness_density'].to_numpy(dtype='float64'), 1e-7))
+
+    chunk_dir = os.path.join(out_dir, 'chunks')
+    os.makedirs(chunk_dir, exist_ok=True)
+    check_run_config(out_dir, {'periods': periods, 'chunk_size': chunk_size, 'lam': float(lam), 'counties': len(series)})
+
+    cfips_list = sorted(series)
+    chunks = []
+    for i in range(0, len(cfips_list), chunk_size):
+        path = os.path.join(chunk_dir, 'chunk_{:05d}.csv'.format(i // chunk_size))
+        if not os.path.exists(path):
+            chunks.append((path, [(cfips,) + series[cfips] for cfips in cfips_list[i:i + chunk_size]]))
+
+    done = len(cfips_list) - sum(len(chunk) for _, chunk in chunks)
+    if done:
+        print('Resuming: {}/{} counties already fitted'.format(done, len(cfips_list)))
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(lam, periods)) as pool:
+        futures = [pool.submit(fit_chunk, path, chunk) for path, chunk in chunks]
+        for future in as_completed(futures):
+            done += future.result()
+            print('Fitted {}/{} counties ({:.0f}s)'.format(done, len(cfips_list), time.time() - start))
+
+    forecasts = pd.concat([pd.read_csv(path) for path in sorted(glob.glob(os.path.join(chunk_dir, 'chunk_*.csv')))], ignore_index=True)
+    forecasts.to_csv(os.path.join(out_dir, 'forecast.csv'), index=False)
+    return forecasts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit one Prophet model per county in parallel')
+    parser.add_argument('train')
+    parser.add_argument('out_dir')
+    parser.add_argument('--test', default=None, help='test.csv; when given, OUT_DIR/submission.csv is written for its rows')
+    parser.add_argument('--periods', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    args = parser.parse_args()
+
+    forecasts = forecast_counties(pd.read_csv(args.train), args.out_dir, args.periods, args.workers, args.chunk_size)
+    if args.test is not None:
+        test_df = pd.read_csv(args.test)
+        submission = test_df[['row_id']].merge(forecasts[['row_id', 'microbusiness_density']], on='row_id', how='left')
+        submission.to_csv(os.path.join(args.out_dir, 'submission.csv'), index=False)